@@ -1,5 +1,5 @@
-from fastapi import APIRouter
-from app.models.schemas import QueryRequest
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import QueryRequest, VectorIndexRequest
 from app.workflows.enhanced_frag import process_enhanced_query
 
 router = APIRouter()
@@ -15,23 +15,79 @@ async def get_swarm_statistics():
     """Get swarm intelligence statistics"""
     from app.services.swarm_retrieval import swarm_retriever
     
-    # Calculate agent distribution
-    explorer_count = sum(1 for agent in swarm_retriever.agents if agent.specialization == 'explorer')
-    exploiter_count = sum(1 for agent in swarm_retriever.agents if agent.specialization == 'exploiter')
-    scout_count = sum(1 for agent in swarm_retriever.agents if agent.specialization == 'scout')
-    
     return {
         "total_agents": swarm_retriever.n_agents,
         "consensus_score": swarm_retriever.get_consensus(),
         "global_best_score": swarm_retriever.global_best_score,
-        "specialization_distribution": {
-            "explorer": explorer_count,
-            "exploiter": exploiter_count,
-            "scout": scout_count
-        },
+        "specialization_distribution": (swarm_retriever.last_search or {}).get("specialization_distribution"),
+        "search": swarm_retriever.get_statistics(),
         "status": "active"
     }
 
+@router.get("/embedding/statistics")
+async def get_embedding_statistics():
+    """Get embedding service batching and queue metrics"""
+    from app.services.embedding_service import embedding_service
+    return embedding_service.get_statistics()
+
+@router.get("/retrieval-cache/statistics")
+async def get_retrieval_cache_statistics():
+    """Get retrieval result cache hit/miss/eviction counters"""
+    from app.services.retrieval_cache import retrieval_cache
+    return retrieval_cache.get_statistics()
+
+@router.get("/answer-cache/statistics")
+async def get_answer_cache_statistics():
+    """Get semantic answer cache hit/miss/eviction counters"""
+    from app.services.answer_cache import answer_cache
+    return answer_cache.get_statistics()
+
+@router.get("/reranker/statistics")
+async def get_reranker_statistics():
+    """Get cross-encoder reranking latency and truncation metrics"""
+    from app.services.reranker import reranker
+    return reranker.get_statistics()
+
+@router.get("/vector-index/statistics")
+async def get_vector_index_statistics():
+    """Get in-process vector index state"""
+    from app.services.vector_index import local_vector_index
+    return local_vector_index.get_statistics()
+
+@router.get("/ingestion/parse-stats")
+async def get_parse_stats():
+    """Get per-document parse timings for recent uploads"""
+    from app.services.ingestion import chunker
+    from app.core.config import settings
+    return {
+        "parse_workers": settings.parse_workers,
+        "documents": list(chunker.parse_timings)
+    }
+
+@router.get("/ingestion/embedding-cache")
+async def get_embedding_cache_stats():
+    """Get ingestion embedding cache usage"""
+    from app.services.ingestion import chunker
+    from app.core.config import settings
+    from app.core.database import db_manager
+    
+    cached_vectors = 0
+    if db_manager.pg_pool:
+        async with db_manager.pg_pool.acquire() as conn:
+            cached_vectors = await conn.fetchval(
+                "SELECT COUNT(*) FROM embedding_cache WHERE model = $1", settings.embedding_model
+            ) or 0
+    
+    lookups = chunker.embedding_cache_hits + chunker.embedding_cache_misses
+    return {
+        "enabled": settings.embedding_cache,
+        "model": settings.embedding_model,
+        "cached_vectors": cached_vectors,
+        "hits": chunker.embedding_cache_hits,
+        "misses": chunker.embedding_cache_misses,
+        "hit_rate": chunker.embedding_cache_hits / lookups if lookups else 0.0
+    }
+
 @router.get("/holographic/efficiency")
 async def get_holographic_efficiency():
     """Get holographic storage efficiency"""
@@ -98,3 +154,15 @@ async def get_metamorphic_report():
     """Get metamorphic testing report"""
     from app.services.metamorphic_testing import metamorphic_tester
     return metamorphic_tester.generate_test_report()
+
+@router.post("/admin/vector-index")
+async def rebuild_vector_index(request: VectorIndexRequest):
+    """Create or rebuild the ANN index on chunk embeddings"""
+    from app.core.database import db_manager
+    try:
+        return await db_manager.create_vector_index(
+            request.index_type, rebuild=True, m=request.m,
+            ef_construction=request.ef_construction, lists=request.lists
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,18 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+background_tasks = set()  # strong references - the event loop only keeps weak ones
+
+def run_in_background(coro) -> asyncio.Task:
+    """Start a fire-and-forget task that is neither garbage-collected early nor fails silently"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task failed: {task.exception()!r}")
@@ -24,6 +24,59 @@ class Settings(BaseSettings):
     max_chunk_size: int = 1000
     min_chunk_size: int = 200
     max_results: int = 10
+    embedding_batch_size: int = 64
+    embedding_max_wait_ms: float = 5.0
+    embedding_workers: int = 1
+    query_embedding_cache_size: int = 1024
+    query_embedding_cache_ttl: int = 3600  # seconds
+    vector_index_type: str = "hnsw"  # "hnsw", "ivfflat" or "none"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
+    normalize_embeddings: bool = False  # store unit vectors and search with inner product
+    lexical_search: bool = True  # corpus-wide full-text search fused with vector search
+    rrf_k: int = 60
+    two_stage_retrieval: bool = False  # pick top documents by document vector, then search their chunks
+    two_stage_documents: int = 5
+    retrieval_cache: bool = True  # reuse results for repeated queries until the corpus changes
+    retrieval_cache_size: int = 512
+    answer_cache: bool = True  # semantic cache of full pipeline answers
+    answer_cache_size: int = 1000
+    answer_cache_threshold: float = 0.97  # cosine similarity for a hit
+    answer_cache_persist: bool = False
+    quantum_multi_interpretation: bool = False  # query paraphrases interfere in quantum retrieval
+    swarm_iterations: int = 20
+    swarm_patience: int = 5  # stop after this many iterations without a better global best (0 = off)
+    swarm_min_improvement: float = 1e-4
+    swarm_velocity_tolerance: float = 0.0  # stop once RMS agent velocity drops below this
+    swarm_time_budget_ms: Optional[float] = None  # anytime mode: best ranking found within the budget
+    swarm_seed: Optional[int] = 0  # combined with the query for reproducible swarms; None = unseeded
+    swarm_workers: int = 2  # process pool for swarm optimization; 0 runs on a thread
+    reranker: bool = False  # cross-encoder rerank before generation
+    reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    reranker_top_k: int = 5
+    reranker_budget_ms: float = 150.0
+    reranker_batch_size: int = 16
+    reranker_workers: int = 1
+    batch_query_max_size: int = 256
+    batch_query_concurrency: int = 4  # per-query pipelines running at once in /query/batch
+    local_vector_index: bool = False  # in-process memory-mapped mirror of chunk embeddings
+    local_vector_index_path: str = "data/vector_index"
+    local_vector_index_ivf_threshold: int = 50000  # exact scan below this many chunks
+    local_vector_index_nprobe: int = 8
+    parse_workers: int = 2  # process pool for PDF/DOCX parsing; 0 parses in-process
+    parse_split_pdfs: bool = True
+    parse_pages_per_task: int = 16
+    ingestion_workers_in_api: int = 1  # 0 leaves ingestion to standalone workers
+    ingestion_poll_interval: float = 1.0  # seconds
+    ingestion_job_timeout: int = 600  # seconds without progress before a job is requeued
+    ingestion_job_max_attempts: int = 3
+    bulk_ingestion_queue_size: int = 8  # batches buffered between pipeline stages
+    bulk_ingestion_runs_kept: int = 100  # finished runs kept for /upload/batch/{run_id}
+    embedding_cache: bool = True  # reuse vectors for identical chunk text across documents
+    dedupe_documents: bool = True  # skip re-ingesting a byte-identical file
     
     class Config:
         env_file = ".env"
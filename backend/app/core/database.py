@@ -1,25 +1,58 @@
+import asyncio
 import asyncpg
+import json
+from pgvector.asyncpg import register_vector
 from neo4j import GraphDatabase
 from sentence_transformers import SentenceTransformer
 from app.core.config import settings
+from app.core.background import run_in_background
+from typing import Dict, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
+VECTOR_INDEX_NAME = "chunks_embedding_idx"
+VECTOR_INDEX_BUILD_NAME = "chunks_embedding_idx_build"  # built concurrently, then swapped in
+VECTOR_INDEX_TYPES = ("hnsw", "ivfflat", "none")
+LISTENER_RECONNECT_MAX_DELAY = 30.0  # seconds between attempts once backed off
+
+def _encode_jsonb(value) -> bytes:
+    # JSONB binary wire format: version byte followed by the JSON text
+    return b'\x01' + json.dumps(value).encode('utf-8')
+
+def _decode_jsonb(data: bytes):
+    return json.loads(data[1:].decode('utf-8'))
+
 class DatabaseManager:
     def __init__(self):
         self.pg_pool = None
         self.neo4j_driver = None
+        self.listener_conn = None
+        self.listeners = {}  # channel -> callbacks, re-registered after a reconnect
+        self.reconnect_callbacks = []
+        self.closing = False
         self.embedding_model = SentenceTransformer(settings.embedding_model)
     
+    async def _init_connection(self, conn):
+        """Register binary codecs so vectors and JSONB skip text formatting/parsing"""
+        await register_vector(conn)
+        await conn.set_type_codec(
+            'jsonb', encoder=_encode_jsonb, decoder=_decode_jsonb,
+            schema='pg_catalog', format='binary'
+        )
+    
     async def init_postgres(self):
         try:
-            self.pg_pool = await asyncpg.create_pool(settings.database_url)
+            # Create vector extension first - the pool's codecs need the type to exist
+            conn = await asyncpg.connect(settings.database_url)
+            try:
+                await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            finally:
+                await conn.close()
+            
+            self.pg_pool = await asyncpg.create_pool(settings.database_url, init=self._init_connection)
             # Create required tables with all columns
             async with self.pg_pool.acquire() as conn:
-                # Create vector extension first
-                await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
-                
                 # Create documents table with all required columns
                 await conn.execute("""
                     CREATE TABLE IF NOT EXISTS documents (
@@ -79,16 +112,209 @@ class DatabaseManager:
                     )
                 """)
                 
+                # Create ingestion job queue table
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                        id SERIAL PRIMARY KEY,
+                        filename VARCHAR(255) NOT NULL,
+                        file_path TEXT NOT NULL,
+                        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                        document_id INTEGER,
+                        pages_parsed INTEGER DEFAULT 0,
+                        chunks_embedded INTEGER DEFAULT 0,
+                        attempts INTEGER DEFAULT 0,
+                        worker_id VARCHAR(255),
+                        error TEXT,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        started_at TIMESTAMP,
+                        finished_at TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT NOW()
+                    )
+                """)
+                await conn.execute(
+                    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS target_document_id INTEGER"
+                )
+                await conn.execute(
+                    "CREATE INDEX IF NOT EXISTS ingestion_jobs_queued_idx ON ingestion_jobs (id) WHERE status = 'queued'"
+                )
+                
                 # Ensure all columns exist (for existing tables)
                 await conn.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS metadata JSONB")
                 await conn.execute("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS metadata JSONB")
                 await conn.execute("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS chunk_index INTEGER")
                 
+                # Content hashes for deduplication and the embedding cache
+                await conn.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_hash TEXT")
+                await conn.execute("ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_hash TEXT")
+                await conn.execute("CREATE INDEX IF NOT EXISTS documents_file_hash_idx ON documents (file_hash)")
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        content_hash TEXT NOT NULL,
+                        model VARCHAR(255) NOT NULL,
+                        embedding vector(384) NOT NULL,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        PRIMARY KEY (content_hash, model)
+                    )
+                """)
+                
+                # Staging for streamed ingestion: page text is joined into documents.content and
+                # revised chunks are copied into chunks by Postgres. Rows outlive a stream only
+                # if its process died, so old ones are swept on startup.
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS document_pages (
+                        stream_id TEXT NOT NULL,
+                        document_id INTEGER,
+                        seq INTEGER NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        PRIMARY KEY (stream_id, seq)
+                    )
+                """)
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS chunk_staging (
+                        stream_id TEXT NOT NULL,
+                        chunk_index INTEGER NOT NULL,
+                        content TEXT NOT NULL,
+                        content_hash TEXT,
+                        metadata JSONB,
+                        embedding vector(384),
+                        created_at TIMESTAMP DEFAULT NOW(),
+                        PRIMARY KEY (stream_id, chunk_index)
+                    )
+                """)
+                await conn.execute("DELETE FROM document_pages WHERE created_at < NOW() - INTERVAL '1 day'")
+                await conn.execute("DELETE FROM chunk_staging WHERE created_at < NOW() - INTERVAL '1 day'")
+                
+                # Semantic answer cache (only used with ANSWER_CACHE_PERSIST); cleared on corpus changes
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS answer_cache (
+                        id SERIAL PRIMARY KEY,
+                        query TEXT NOT NULL,
+                        embedding vector(384) NOT NULL,
+                        document_ids INTEGER[],
+                        search_params JSONB,
+                        response JSONB NOT NULL,
+                        created_at TIMESTAMP DEFAULT NOW()
+                    )
+                """)
+                
+                # Full-text index - the generated column keeps it in sync on insert/delete
+                await conn.execute("""
+                    ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector
+                    GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+                """)
+                await conn.execute("CREATE INDEX IF NOT EXISTS chunks_content_tsv_idx ON chunks USING GIN (content_tsv)")
+                
+                # Document-level vectors (mean-pooled chunk embeddings) for coarse-to-fine retrieval.
+                # Documents are few next to chunks, so they are scanned exactly.
+                await conn.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding vector(384)")
+                await conn.execute("CREATE INDEX IF NOT EXISTS chunks_document_id_idx ON chunks (document_id)")
+                await conn.execute("""
+                    UPDATE documents d SET embedding = pooled.embedding
+                    FROM (
+                        SELECT document_id, avg(embedding) AS embedding FROM chunks
+                        WHERE document_id IN (SELECT id FROM documents WHERE embedding IS NULL)
+                        GROUP BY document_id
+                    ) pooled
+                    WHERE d.id = pooled.document_id
+                """)
+                
+                # ANN index on chunk embeddings
+                await self.create_vector_index(conn=conn)
+                
             logger.info("PostgreSQL connection established and tables created")
         except Exception as e:
             logger.error(f"PostgreSQL connection failed: {e}")
             raise
     
+    def vector_distance_sql(self, column: str, param: str) -> str:
+        """Distance expression using the operator the vector index was built for"""
+        operator = '<#>' if settings.normalize_embeddings else '<=>'
+        return f"({column} {operator} {param}::vector)"
+    
+    def vector_similarity_sql(self, column: str, param: str) -> str:
+        """Similarity expression (higher is better) matching vector_distance_sql"""
+        distance = self.vector_distance_sql(column, param)
+        # <#> is the negative inner product, which equals cosine similarity for unit vectors
+        return f"-{distance}" if settings.normalize_embeddings else f"1 - {distance}"
+    
+    async def create_vector_index(self, index_type: str = None, rebuild: bool = False,
+                                  m: int = None, ef_construction: int = None,
+                                  lists: int = None, conn=None) -> Dict[str, Any]:
+        """
+        Create (or rebuild) the HNSW/IVFFlat index on chunks.embedding. Without
+        `rebuild`, an existing index is kept, with a warning if it no longer matches
+        the requested type, operator class or options. Builds run CONCURRENTLY
+        under a temporary name and are swapped in, so inserts and searches continue.
+        """
+        index_type = (index_type or settings.vector_index_type).lower()
+        if index_type not in VECTOR_INDEX_TYPES:
+            raise ValueError(f"Unsupported vector index type: {index_type}")
+        
+        ops = 'vector_ip_ops' if settings.normalize_embeddings else 'vector_cosine_ops'
+        if index_type == 'hnsw':
+            options = {
+                "m": m or settings.hnsw_m,
+                "ef_construction": ef_construction or settings.hnsw_ef_construction
+            }
+        elif index_type == 'ivfflat':
+            options = {"lists": lists or settings.ivfflat_lists}
+        else:
+            options = {}
+        
+        async def _create(conn):
+            current = await conn.fetchval(
+                "SELECT indexdef FROM pg_indexes WHERE indexname = $1", VECTOR_INDEX_NAME
+            )
+            if index_type == 'none':
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}")
+                return
+            if current and not rebuild:
+                if not self._index_matches(current, index_type, ops, options):
+                    # e.g. NORMALIZE_EMBEDDINGS changed: queries use another operator and can't use this index
+                    logger.warning(
+                        f"Vector index does not match the configured {index_type} {ops} {options}: {current}. "
+                        f"Rebuild it with POST /admin/vector-index."
+                    )
+                return
+            
+            # Clear a build left invalid by an interrupted rebuild
+            await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_BUILD_NAME}")
+            with_clause = ", ".join(f"{key} = {int(value)}" for key, value in options.items())
+            await conn.execute(f"""
+                CREATE INDEX CONCURRENTLY {VECTOR_INDEX_BUILD_NAME} ON chunks
+                USING {index_type} (embedding {ops}) WITH ({with_clause})
+            """)
+            async with conn.transaction():
+                await conn.execute(f"DROP INDEX IF EXISTS {VECTOR_INDEX_NAME}")
+                await conn.execute(f"ALTER INDEX {VECTOR_INDEX_BUILD_NAME} RENAME TO {VECTOR_INDEX_NAME}")
+        
+        if conn is not None:
+            await _create(conn)
+        else:
+            async with self.pg_pool.acquire() as conn:
+                await _create(conn)
+        
+        logger.info(f"Vector index ready: {index_type} {options}")
+        return {"index": VECTOR_INDEX_NAME, "type": index_type, "operator_class": ops, "options": options}
+    
+    @staticmethod
+    def _index_matches(indexdef: str, index_type: str, ops: str, options: Dict[str, int]) -> bool:
+        """Compare pg_indexes.indexdef, e.g. "... USING hnsw (embedding vector_ip_ops) WITH (m='16', ...)" """
+        return (
+            f"USING {index_type} " in indexdef
+            and f" {ops})" in indexdef
+            and all(f"{key}='{int(value)}'" in indexdef for key, value in options.items())
+        )
+    
+    async def apply_search_params(self, conn, ef_search: int = None, probes: int = None):
+        """Set ANN recall/latency knobs for the current transaction"""
+        await conn.execute(
+            "SELECT set_config('hnsw.ef_search', $1, true), set_config('ivfflat.probes', $2, true)",
+            str(int(ef_search or settings.hnsw_ef_search)),
+            str(int(probes or settings.ivfflat_probes))
+        )
+    
     def init_neo4j(self):
         try:
             # Temporarily disabled due to connection issues
@@ -107,7 +333,54 @@ class DatabaseManager:
             logger.error(f"Neo4j connection failed: {e}")
             self.neo4j_driver = None
     
+    async def add_listener(self, channel: str, callback):
+        """LISTEN on a channel over a dedicated connection (pooled ones get recycled)"""
+        self.listeners.setdefault(channel, []).append(callback)
+        if self.listener_conn is None:
+            await self._connect_listener()
+        else:
+            await self.listener_conn.add_listener(channel, callback)
+    
+    def on_listener_reconnect(self, callback):
+        """Await `callback()` after the listener connection is re-established - notifications sent meanwhile are lost"""
+        self.reconnect_callbacks.append(callback)
+    
+    async def _connect_listener(self):
+        conn = await asyncpg.connect(settings.database_url)
+        conn.add_termination_listener(self._on_listener_terminated)
+        for channel, callbacks in self.listeners.items():
+            for callback in callbacks:
+                await conn.add_listener(channel, callback)
+        self.listener_conn = conn
+    
+    def _on_listener_terminated(self, conn):
+        if conn is not self.listener_conn or self.closing:
+            return  # closed on purpose
+        logger.warning("Listener connection lost, reconnecting")
+        self.listener_conn = None
+        run_in_background(self._reconnect_listener())
+    
+    async def _reconnect_listener(self):
+        delay = 1.0
+        while not self.closing:
+            try:
+                await self._connect_listener()
+                break
+            except Exception as e:
+                logger.error(f"Listener reconnect failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LISTENER_RECONNECT_MAX_DELAY)
+        if self.closing:
+            return
+        logger.info("Listener connection re-established")
+        for callback in self.reconnect_callbacks:
+            await callback()
+    
     async def close(self):
+        self.closing = True
+        if self.listener_conn:
+            conn, self.listener_conn = self.listener_conn, None
+            await conn.close()
         if self.pg_pool:
             await self.pg_pool.close()
         if self.neo4j_driver:
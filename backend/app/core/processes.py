@@ -0,0 +1,7 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+def spawn_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Process pool for CPU-bound work that should not hold the API process's GIL"""
+    # spawn, not fork: the API process holds torch threads and an event loop
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
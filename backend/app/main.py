@@ -4,11 +4,29 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 import asyncio
 import os
+import socket
+import uuid
 from pathlib import Path
+from typing import List
 from app.core.database import db_manager
-from app.models.schemas import QueryRequest, QueryResponse
-from app.workflows.enhanced_frag import process_enhanced_query
+from app.core.background import run_in_background
+from app.models.schemas import (
+    QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse, BatchRetrievalResponse, RetrievalResult
+)
+from app.workflows.enhanced_frag import process_enhanced_query, process_enhanced_queries
+from app.services.retrieval import SimpleRetriever
 from app.services.ingestion import chunker
+from app.services.embedding_service import embedding_service
+from app.services.vector_index import local_vector_index
+from app.core.config import settings
+from app.services.ingestion_jobs import (
+    ingestion_queue, DOCUMENT_INGESTED_CHANNEL, DOCUMENT_DELETED_CHANNEL, notify_document, parse_document_notification
+)
+from app.services.retrieval_cache import retrieval_cache
+from app.services.answer_cache import answer_cache
+from app.services.reranker import reranker
+from app.services.swarm_retrieval import swarm_retriever
+from app.services.bulk_ingestion import bulk_ingestion, SUPPORTED_EXTENSIONS
 from app.services.resume_analyzer import analyze_resume_with_gemini
 
 # Import API extensions
@@ -19,8 +37,54 @@ async def lifespan(app: FastAPI):
     # Startup
     await db_manager.init_postgres()
     db_manager.init_neo4j()
+    embedding_service.start()
+    if settings.local_vector_index:
+        await local_vector_index.load()
+    if settings.answer_cache and settings.answer_cache_persist:
+        await answer_cache.load()
+    if settings.reranker:
+        await reranker.warmup()
+    
+    # Documents ingested or deleted by any process are announced over LISTEN/NOTIFY.
+    # The sending process already updated its own index and caches, so it skips its echo.
+    def on_document_ingested(conn, pid, channel, payload):
+        doc_id, own = parse_document_notification(payload)
+        if own:
+            return
+        retrieval_cache.bump_corpus_version()
+        run_in_background(local_vector_index.reload_document(doc_id))
+    
+    def on_document_deleted(conn, pid, channel, payload):
+        doc_id, own = parse_document_notification(payload)
+        if own:
+            return
+        retrieval_cache.bump_corpus_version()
+        run_in_background(local_vector_index.remove_document(doc_id))
+    
+    await db_manager.add_listener(DOCUMENT_INGESTED_CHANNEL, on_document_ingested)
+    await db_manager.add_listener(DOCUMENT_DELETED_CHANNEL, on_document_deleted)
+    
+    async def on_listener_reconnected():
+        # Changes announced while disconnected were missed - resync from Postgres
+        retrieval_cache.bump_corpus_version()
+        if settings.local_vector_index:
+            await local_vector_index.load()
+    
+    db_manager.on_listener_reconnect(on_listener_reconnected)
+    
+    stop_workers = asyncio.Event()
+    workers = [
+        asyncio.create_task(ingestion_queue.run_worker(f"{socket.gethostname()}:{os.getpid()}:{i}", stop_workers))
+        for i in range(settings.ingestion_workers_in_api)
+    ]
     yield
     # Shutdown
+    stop_workers.set()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await embedding_service.stop()
+    chunker.shutdown()
+    reranker.shutdown()
+    swarm_retriever.shutdown()
     await db_manager.close()
 
 app = FastAPI(title="Agentic RAG Research System", version="1.0.0", lifespan=lifespan)
@@ -39,9 +103,21 @@ app.include_router(api_router)
 async def root():
     return {"message": "AI Research Agent API", "docs": "/docs"}
 
+async def save_upload(file: UploadFile, filename: str) -> Path:
+    """
+    Save an upload under its own directory. Jobs read the file after the request
+    returns, so a later upload with the same name must not overwrite it.
+    """
+    upload_dir = Path("data") / "pdfs" / uuid.uuid4().hex
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    file_path = upload_dir / filename
+    with open(file_path, "wb") as buffer:
+        buffer.write(await file.read())
+    return file_path
+
 @app.post("/upload", response_model=dict)
 async def upload_document(file: UploadFile = File(...)):
-    """Upload and process a research document"""
+    """Upload a research document and queue it for background ingestion"""
     filename = os.path.basename(file.filename or "")
     if not filename:
         raise HTTPException(status_code=400, detail="Missing filename")
@@ -50,32 +126,89 @@ async def upload_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Unsupported file type")
     
     # Save uploaded file
-    upload_dir = Path("data") / "pdfs"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    file_path = upload_dir / filename
-    
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    file_path = await save_upload(file, filename)
     
-    # Process document
-    doc_id = await chunker.process_document(str(file_path))
+    # Queue for ingestion - any worker (in-process or standalone) picks it up
+    job_id = await ingestion_queue.enqueue(filename, str(file_path.resolve()))
     
     return {
-        "message": "Document processed successfully",
-        "document_id": doc_id,
+        "message": "Document queued for processing",
+        "job_id": job_id,
+        "status": "queued",
         "filename": filename
     }
 
+@app.post("/upload/batch", response_model=dict)
+async def upload_documents_batch(files: List[UploadFile] = File(...)):
+    """Upload several documents and ingest them through the staged bulk pipeline"""
+    saved = []
+    for file in files:
+        filename = os.path.basename(file.filename or "")
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {filename or '<missing>'}")
+        saved.append(str(await save_upload(file, filename)))
+    
+    run = bulk_ingestion.create_run(saved)
+    run_in_background(bulk_ingestion.ingest(saved, run))
+    return {"message": "Bulk ingestion started", "run_id": run.run_id, "files": len(saved)}
+
+@app.get("/upload/batch/{run_id}")
+async def get_batch_status(run_id: str):
+    """Get progress and throughput of a bulk ingestion run"""
+    run = bulk_ingestion.runs.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run.report()
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: int):
+    """Get ingestion job status and progress"""
+    job = await ingestion_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """Query the research documents using FRAG workflow"""
     try:
-        response = await process_enhanced_query(request.query, request.document_ids)
+        response = await process_enhanced_query(request.query, request.document_ids, request.search_params())
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _check_batch_size(request: BatchQueryRequest):
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > settings.batch_query_max_size:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.batch_query_max_size} queries per batch"
+        )
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """Run many queries through the FRAG workflow with shared embedding and retrieval"""
+    _check_batch_size(request)
+    try:
+        results = await process_enhanced_queries(request.queries, request.document_ids, request.search_params())
+        return BatchQueryResponse(results=results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/query/batch/retrieve", response_model=BatchRetrievalResponse)
+async def retrieve_batch(request: BatchQueryRequest):
+    """Retrieval only: ranked chunks for each query, no answer generation"""
+    _check_batch_size(request)
+    try:
+        results = await SimpleRetriever().retrieve_batch(
+            request.queries, request.max_results, request.document_ids, request.search_params()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return BatchRetrievalResponse(results=[
+        RetrievalResult(query=query, chunks=chunks) for query, chunks in zip(request.queries, results)
+    ])
+
 @app.get("/documents")
 async def list_documents():
     """List all uploaded documents"""
@@ -106,6 +239,10 @@ async def delete_document(document_id: int):
         
         # Delete from PostgreSQL (cascades to chunks and holographic_storage)
         await conn.execute("DELETE FROM documents WHERE id = $1", document_id)
+        await local_vector_index.remove_document(document_id)
+        retrieval_cache.bump_corpus_version()
+        # Other API processes drop it from their index and caches too
+        await notify_document(conn, DOCUMENT_DELETED_CHANNEL, document_id)
         
         # Delete from Neo4j (disabled temporarily)
         # if db_manager.neo4j_driver:
@@ -114,6 +251,27 @@ async def delete_document(document_id: int):
     
     return {"message": f"Document '{doc['filename']}' deleted successfully"}
 
+@app.put("/documents/{document_id}")
+async def update_document(document_id: int, file: UploadFile = File(...)):
+    """Upload a revised version of a document; only changed chunks are re-embedded"""
+    filename = os.path.basename(file.filename or "")
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    async with db_manager.pg_pool.acquire() as conn:
+        if not await conn.fetchval("SELECT 1 FROM documents WHERE id = $1", document_id):
+            raise HTTPException(status_code=404, detail="Document not found")
+    
+    file_path = await save_upload(file, filename)
+    job_id = await ingestion_queue.enqueue(filename, str(file_path.resolve()), target_document_id=document_id)
+    return {
+        "message": "Document update queued",
+        "job_id": job_id,
+        "status": "queued",
+        "document_id": document_id,
+        "filename": filename
+    }
+
 @app.post("/feedback")
 async def submit_feedback(feedback_data: dict):
     """Submit user feedback for query responses"""
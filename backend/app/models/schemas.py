@@ -1,17 +1,39 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-class QueryRequest(BaseModel):
-    query: str
+class SearchRequest(BaseModel):
+    """Retrieval options shared by single and batch queries"""
     max_results: int = 10
     document_ids: Optional[List[int]] = None
+    ef_search: Optional[int] = None  # HNSW recall/latency knob, defaults to settings
+    probes: Optional[int] = None     # IVFFlat recall/latency knob, defaults to settings
+    top_documents: Optional[int] = None  # coarse-to-fine: search only the N closest documents
+
+    def search_params(self) -> Dict[str, int]:
+        return {"ef_search": self.ef_search, "probes": self.probes, "top_documents": self.top_documents}
+
+class QueryRequest(SearchRequest):
+    query: str
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Dict[str, Any]]
     query_type: str  # "simple" or "complex"
     confidence: float
+    cached: bool = False  # served from the semantic answer cache
+
+class BatchQueryRequest(SearchRequest):
+    queries: List[str]
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
+
+class VectorIndexRequest(BaseModel):
+    index_type: str = "hnsw"  # "hnsw", "ivfflat" or "none"
+    m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    lists: Optional[int] = None
 
 class DocumentUpload(BaseModel):
     filename: str
@@ -24,8 +46,17 @@ class Chunk(BaseModel):
     document_id: int
     chunk_index: int
     metadata: Dict[str, Any]
-    embedding: Optional[List[float]] = None
+    # Stored vector (np.ndarray from the pgvector codec); never serialized into responses
+    embedding: Optional[Any] = Field(default=None, exclude=True)
     similarity_score: Optional[float] = None
+    rerank_score: Optional[float] = None  # cross-encoder relevance, when the reranker ran
+
+class RetrievalResult(BaseModel):
+    query: str
+    chunks: List[Chunk]
+
+class BatchRetrievalResponse(BaseModel):
+    results: List[RetrievalResult]
 
 class Entity(BaseModel):
     id: int
@@ -0,0 +1,150 @@
+import asyncio
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from app.core.database import db_manager
+from app.core.config import settings
+from app.core.background import run_in_background
+from app.models.schemas import QueryResponse
+from app.services.retrieval_cache import retrieval_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """
+    Semantic cache in front of the full query pipeline: a new query whose
+    embedding is within `threshold` cosine similarity of a cached one, with the
+    same document filter and search params, gets the cached answer back.
+    Embeddings live in a fixed-size matrix (one row per slot) with LRU eviction;
+    entries are dropped on every corpus change. Optionally persisted to Postgres.
+    """
+
+    def __init__(self, max_size: int = None, threshold: float = None):
+        self.max_size = max_size or settings.answer_cache_size
+        self.threshold = threshold if threshold is not None else settings.answer_cache_threshold
+        self.matrix = None              # (max_size, dimensions), unit rows; free slots are zero
+        self.slots = OrderedDict()      # slot -> {query, filter_key, response}, in LRU order
+        self.free_slots = list(range(self.max_size - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        retrieval_cache.on_corpus_change(self.invalidate)
+
+    @property
+    def corpus_version(self) -> int:
+        return retrieval_cache.corpus_version
+
+    @staticmethod
+    def filter_key(document_ids: Optional[List[int]], search_params: Dict[str, int] = None) -> Tuple:
+        params = tuple(sorted((key, value) for key, value in (search_params or {}).items() if value is not None))
+        return (tuple(sorted(set(document_ids))) if document_ids else None, params)
+
+    def lookup(self, embedding: np.ndarray, filter_key: Tuple) -> Optional[QueryResponse]:
+        if not settings.answer_cache:
+            return None
+        if self.slots:
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) + 1e-12)
+            scores = self.matrix @ query
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                entry = self.slots.get(int(slot))
+                if entry is not None and entry["filter_key"] == filter_key:
+                    self.slots.move_to_end(int(slot))
+                    self.hits += 1
+                    return entry["response"].model_copy(update={"cached": True})
+        self.misses += 1
+        return None
+
+    def store(self, query: str, embedding: np.ndarray, filter_key: Tuple,
+              response: QueryResponse, corpus_version: int, persist: bool = True):
+        """Cache an answer computed at `corpus_version`; answers that raced a corpus change are dropped"""
+        if not settings.answer_cache or corpus_version != self.corpus_version:
+            return
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if self.matrix is None:
+            self.matrix = np.zeros((self.max_size, len(embedding)), dtype=np.float32)
+
+        if not self.free_slots:
+            evicted, _ = self.slots.popitem(last=False)
+            self.matrix[evicted] = 0.0
+            self.free_slots.append(evicted)
+            self.evictions += 1
+        slot = self.free_slots.pop()
+        self.matrix[slot] = embedding / (np.linalg.norm(embedding) + 1e-12)
+        self.slots[slot] = {"query": query, "filter_key": filter_key, "response": response}
+
+        if persist and settings.answer_cache_persist:
+            run_in_background(self._persist(query, embedding, filter_key, response))
+
+    def invalidate(self, corpus_version: int = None):
+        """Drop every cached answer - the corpus they were computed on is gone"""
+        if self.slots:
+            self.invalidations += 1
+            self.slots.clear()
+            self.matrix[:] = 0.0
+            self.free_slots = list(range(self.max_size - 1, -1, -1))
+        if settings.answer_cache_persist and db_manager.pg_pool:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            run_in_background(self._clear_persisted())
+
+    async def load(self):
+        """Warm the cache from Postgres, most recent answers first"""
+        async with db_manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT query, embedding, document_ids, search_params, response
+                FROM answer_cache ORDER BY id DESC LIMIT $1
+            """, self.max_size)
+        version = self.corpus_version
+        for row in reversed(rows):
+            filter_key = self.filter_key(row['document_ids'], row['search_params'])
+            self.store(row['query'], row['embedding'], filter_key,
+                       QueryResponse(**row['response']), version, persist=False)
+        logger.info(f"Answer cache loaded: {len(self.slots)} entries")
+
+    async def _persist(self, query: str, embedding: np.ndarray, filter_key: Tuple, response: QueryResponse):
+        document_ids, params = filter_key
+        try:
+            async with db_manager.pg_pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO answer_cache (query, embedding, document_ids, search_params, response)
+                    VALUES ($1, $2, $3, $4, $5)
+                """, query, embedding, list(document_ids) if document_ids else None,
+                    dict(params), response.model_dump())
+                # Keep the table bounded like the in-memory cache
+                await conn.execute("""
+                    DELETE FROM answer_cache
+                    WHERE id <= (SELECT id FROM answer_cache ORDER BY id DESC OFFSET $1 LIMIT 1)
+                """, self.max_size)
+        except Exception as e:
+            logger.warning(f"Could not persist cached answer: {e}")
+
+    async def _clear_persisted(self):
+        try:
+            async with db_manager.pg_pool.acquire() as conn:
+                await conn.execute("DELETE FROM answer_cache")
+        except Exception as e:
+            logger.warning(f"Could not clear persisted answer cache: {e}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.answer_cache,
+            "persisted": settings.answer_cache_persist,
+            "size": len(self.slots),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "corpus_version": self.corpus_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+answer_cache = SemanticAnswerCache()
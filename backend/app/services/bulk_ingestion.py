@@ -0,0 +1,200 @@
+import asyncio
+import time
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any
+from app.core.config import settings
+from app.services.ingestion import chunker, DocumentStream
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+
+class BulkIngestionRun:
+    """Progress and throughput of one bulk ingestion run"""
+
+    def __init__(self, files: List[str]):
+        self.run_id = uuid.uuid4().hex
+        self.files = files
+        self.status = "queued"
+        self.documents = []  # {filename, document_id, chunks} or {filename, error}
+        self.error = None
+        self.chunks_written = 0
+        self.open_streams = set()  # documents created but not yet finalized or discarded
+        self.started_at = None
+        self.finished_at = None
+
+    def report(self) -> Dict[str, Any]:
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        completed = [doc for doc in self.documents if "error" not in doc]
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "files_total": len(self.files),
+            "files_ingested": len(completed),
+            "files_failed": len(self.documents) - len(completed),
+            "chunks_written": self.chunks_written,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_per_sec": round(len(completed) / elapsed, 3) if elapsed else 0.0,
+            "chunks_per_sec": round(self.chunks_written / elapsed, 3) if elapsed else 0.0,
+            "error": self.error,
+            "documents": self.documents
+        }
+
+class BulkIngestionPipeline:
+    """
+    Staged bulk ingestion: extract -> embed -> write, connected by bounded
+    queues so parsing of file N+1 overlaps embedding of file N and the
+    writes for file N-1. Built on AgenticChunker's streaming document API.
+    """
+
+    def __init__(self):
+        self.runs = {}  # run_id -> BulkIngestionRun
+
+    @staticmethod
+    def discover(directory: str) -> List[str]:
+        return sorted(
+            str(path) for path in Path(directory).rglob("*")
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+
+    def create_run(self, files: List[str]) -> BulkIngestionRun:
+        self._prune_runs()
+        run = BulkIngestionRun(files)
+        self.runs[run.run_id] = run
+        return run
+
+    def _prune_runs(self):
+        """Forget the oldest finished runs beyond bulk_ingestion_runs_kept"""
+        finished = [run_id for run_id, run in self.runs.items() if run.status in ("completed", "failed")]
+        for run_id in finished[:max(len(finished) - settings.bulk_ingestion_runs_kept, 0)]:
+            del self.runs[run_id]
+
+    async def ingest(self, files: List[str], run: BulkIngestionRun = None) -> Dict[str, Any]:
+        run = run or self.create_run(files)
+        run.status = "running"
+        run.started_at = time.perf_counter()
+
+        embed_queue = asyncio.Queue(maxsize=settings.bulk_ingestion_queue_size)
+        write_queue = asyncio.Queue(maxsize=settings.bulk_ingestion_queue_size)
+
+        stages = [
+            asyncio.create_task(self._extract_stage(run, embed_queue)),
+            asyncio.create_task(self._embed_stage(embed_queue, write_queue)),
+            asyncio.create_task(self._write_stage(run, write_queue))
+        ]
+        try:
+            # A stage that dies stops consuming its queue, so the others would block
+            # forever on a full or empty queue - stop them all on the first failure
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for stage in done:
+                stage.result()
+        except BaseException as e:
+            run.status = "failed"
+            run.error = str(e) or type(e).__name__
+            raise
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            if run.status == "failed":
+                await self._discard_open(run)
+            run.finished_at = time.perf_counter()
+
+        run.status = "completed"
+        return run.report()
+
+    async def _extract_stage(self, run: BulkIngestionRun, embed_queue: asyncio.Queue):
+        """Parse and chunk files one after another; page ranges still fan out to the process pool"""
+        for file_path in run.files:
+            stream = chunker.open_document(file_path)
+            try:
+                await chunker.create_document(stream)
+                run.open_streams.add(stream)
+                while not stream.duplicate:
+                    batch = await asyncio.to_thread(stream.next_batch)
+                    if batch is None:
+                        break
+                    await embed_queue.put(("batch", stream, batch))
+            except Exception as e:
+                logger.error(f"Bulk ingestion failed to parse {file_path}: {e}")
+                stream.error = str(e)
+            await embed_queue.put(("end", stream, None))
+        await embed_queue.put(None)
+
+    async def _embed_stage(self, embed_queue: asyncio.Queue, write_queue: asyncio.Queue):
+        while True:
+            item = await embed_queue.get()
+            if item is None:
+                await write_queue.put(None)
+                return
+            kind, stream, batch = item
+            if kind == "batch" and stream.error is None:
+                chunks, offsets, page_text = batch
+                try:
+                    embeddings = await chunker.embed_chunks(chunks)
+                    item = ("batch", stream, (chunks, embeddings, offsets, page_text))
+                except Exception as e:
+                    logger.error(f"Bulk ingestion failed to embed {stream.filename}: {e}")
+                    stream.error = str(e)
+            await write_queue.put(item)
+
+    async def _write_stage(self, run: BulkIngestionRun, write_queue: asyncio.Queue):
+        while True:
+            item = await write_queue.get()
+            if item is None:
+                return
+            kind, stream, batch = item
+
+            if kind == "batch":
+                if stream.error is None:
+                    chunks, embeddings, offsets, page_text = batch
+                    try:
+                        await chunker.write_batch(stream, chunks, embeddings, offsets, page_text)
+                        run.chunks_written += len(chunks)
+                    except Exception as e:
+                        logger.error(f"Bulk ingestion failed to write {stream.filename}: {e}")
+                        stream.error = str(e)
+                continue
+
+            await self._finish_document(run, stream)
+
+    async def _finish_document(self, run: BulkIngestionRun, stream: DocumentStream):
+        run.open_streams.discard(stream)
+        if stream.duplicate and stream.error is None:
+            run.documents.append({
+                "filename": stream.filename,
+                "document_id": stream.doc_id,
+                "chunks": 0,
+                "duplicate": True
+            })
+            return
+
+        if stream.error is None:
+            try:
+                await chunker.finalize_document(stream)
+                run.documents.append({
+                    "filename": stream.filename,
+                    "document_id": stream.doc_id,
+                    "chunks": stream.chunk_count
+                })
+                return
+            except Exception as e:
+                stream.error = str(e)
+
+        await chunker.discard_document(stream)
+        run.chunks_written -= stream.chunk_count
+        run.documents.append({"filename": stream.filename, "error": stream.error})
+
+    async def _discard_open(self, run: BulkIngestionRun):
+        """Remove documents a failed run left half-written"""
+        for stream in run.open_streams:
+            try:
+                await chunker.discard_document(stream)
+            except Exception as e:
+                logger.error(f"Bulk ingestion could not discard {stream.filename}: {e}")
+        run.open_streams.clear()
+
+bulk_ingestion = BulkIngestionPipeline()
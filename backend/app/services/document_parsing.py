@@ -0,0 +1,27 @@
+"""
+Document parsing worker functions.
+
+Kept free of app imports so process-pool workers don't load the database
+manager or the embedding model when they unpickle these functions.
+"""
+import time
+from typing import List, Tuple
+from pypdf import PdfReader
+from docx import Document
+
+def count_pdf_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> Tuple[List[str], float]:
+    """Extract pages [start, end) and report the time spent"""
+    started = time.perf_counter()
+    reader = PdfReader(file_path)
+    pages = [(reader.pages[i].extract_text() or "") for i in range(start, min(end, len(reader.pages)))]
+    return pages, time.perf_counter() - started
+
+def extract_docx_blocks(file_path: str, block_size: int) -> Tuple[List[str], float]:
+    """Extract DOCX paragraphs grouped into blocks of `block_size`"""
+    started = time.perf_counter()
+    paragraphs = [paragraph.text for paragraph in Document(file_path).paragraphs]
+    blocks = ["\n".join(paragraphs[i:i + block_size]) for i in range(0, len(paragraphs), block_size)]
+    return blocks, time.perf_counter() - started
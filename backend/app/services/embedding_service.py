@@ -0,0 +1,295 @@
+import asyncio
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Union, Optional
+from app.core.database import db_manager
+from app.core.config import settings
+
+@dataclass
+class EncodeRequest:
+    texts: List[str]
+    normalize: bool
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+# Per-request embeddings shared by every pipeline stage of one query
+_request_embeddings: ContextVar[Optional[Dict[str, np.ndarray]]] = ContextVar(
+    "request_embeddings", default=None
+)
+
+class QueryEmbeddingCache:
+    """
+    Two-level query embedding cache: a request scope so each pipeline stage
+    reuses the same vector, backed by a bounded LRU with TTL for popular queries.
+    Keyed by normalized query text; vectors are stored raw (unnormalized).
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or settings.query_embedding_cache_size
+        self.ttl = ttl if ttl is not None else settings.query_embedding_cache_ttl
+        self.entries = OrderedDict()  # key -> (embedding, stored_at)
+        self.request_hits = 0
+        self.global_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.split()).casefold()
+
+    @contextmanager
+    def request_scope(self):
+        """Scope the request-level cache to one query"""
+        token = _request_embeddings.set({})
+        try:
+            yield
+        finally:
+            _request_embeddings.reset(token)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        scoped = _request_embeddings.get()
+        if scoped is not None and key in scoped:
+            self.request_hits += 1
+            return scoped[key]
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            embedding, stored_at = entry
+            if time.monotonic() - stored_at <= self.ttl:
+                self.entries.move_to_end(key)
+                self.global_hits += 1
+                if scoped is not None:
+                    scoped[key] = embedding
+                return embedding
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, embedding: np.ndarray):
+        # Shared between callers, so guard against in-place modification
+        embedding.setflags(write=False)
+        scoped = _request_embeddings.get()
+        if scoped is not None:
+            scoped[key] = embedding
+
+        self.entries[key] = (embedding, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_statistics(self) -> Dict[str, Any]:
+        lookups = self.request_hits + self.global_hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "request_hits": self.request_hits,
+            "global_hits": self.global_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.request_hits + self.global_hits) / lookups if lookups else 0.0
+        }
+
+class EmbeddingService:
+    """
+    Micro-batching embedding service: coalesces encode requests from concurrent
+    callers into batches and runs the encoder on a dedicated thread pool,
+    so the event loop never blocks on a forward pass
+    """
+
+    def __init__(self, max_batch_size: int = None, max_wait_ms: float = None, workers: int = None):
+        self.max_batch_size = max_batch_size or settings.embedding_batch_size
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else settings.embedding_max_wait_ms
+        self.workers = workers or settings.embedding_workers
+        self.executor = None
+        self.queue = None
+        self._slots = None
+        self._worker_task = None
+        self._dispatch_tasks = set()  # in-flight batches - the event loop only keeps weak references
+        self.query_cache = QueryEmbeddingCache()
+
+        # Metrics
+        self.batches_run = 0
+        self.texts_encoded = 0
+        self.requests_served = 0
+        self.max_batch_seen = 0
+        self.total_wait_ms = 0.0
+        self.total_encode_ms = 0.0
+
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        if self._worker_task and not self._worker_task.done():
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding")
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._worker_task = asyncio.create_task(self._batching_loop())
+
+    async def stop(self):
+        """Stop batching, let in-flight batches finish and fail requests still queued"""
+        if self._worker_task:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+        if self._dispatch_tasks:
+            await asyncio.gather(*self._dispatch_tasks, return_exceptions=True)
+        while self.queue is not None and not self.queue.empty():
+            self._fail([self.queue.get_nowait()], RuntimeError("Embedding service stopped"))
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def encode(self, texts: Union[str, List[str]], normalize: bool = False) -> np.ndarray:
+        """Encode one text (returns a vector) or a list of texts (returns a matrix)"""
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return np.zeros((0, db_manager.embedding_model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(EncodeRequest(items, normalize, future))
+        embeddings = await future
+        return embeddings[0] if single else embeddings
+
+    async def encode_query(self, query: str, normalize: bool = False) -> np.ndarray:
+        """Encode a query once per request and reuse cached vectors for repeated queries"""
+        key = self.query_cache.normalize_query(query)
+        embedding = self.query_cache.get(key)
+        if embedding is None:
+            # A copy, not a view that would keep the whole batch matrix alive
+            embedding = np.array(await self.encode(query))
+            self.query_cache.put(key, embedding)
+        return self._unit(embedding) if normalize else embedding
+
+    async def encode_queries(self, queries: List[str], normalize: bool = False) -> List[np.ndarray]:
+        """Batch variant of encode_query: cached queries are reused, the rest go out in one encode"""
+        keys = [self.query_cache.normalize_query(query) for query in queries]
+        embeddings = [self.query_cache.get(key) for key in keys]
+        missing = {}  # key -> query, so repeats within the batch are encoded once
+        for key, query, embedding in zip(keys, queries, embeddings):
+            if embedding is None:
+                missing.setdefault(key, query)
+        
+        if missing:
+            encoded = await self.encode(list(missing.values()))
+            for key, embedding in zip(missing, encoded):
+                embedding = np.array(embedding)
+                self.query_cache.put(key, embedding)
+                missing[key] = embedding
+            embeddings = [embedding if embedding is not None else missing[key]
+                          for key, embedding in zip(keys, embeddings)]
+        return [self._unit(embedding) for embedding in embeddings] if normalize else embeddings
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        return embedding / (np.linalg.norm(embedding) + 1e-12)
+    
+    async def ensure_chunk_embeddings(self, chunks: List) -> None:
+        """Fill in embeddings for chunks that came without a stored vector, in one batch"""
+        missing = [chunk for chunk in chunks if getattr(chunk, 'embedding', None) is None]
+        if not missing:
+            return
+        embeddings = await self.encode([chunk.content for chunk in missing])
+        for chunk, embedding in zip(missing, embeddings):
+            chunk.embedding = embedding
+
+    async def _batching_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free encoder thread first so requests keep accumulating meanwhile
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self.max_wait_ms / 1000
+
+            try:
+                while size < self.max_batch_size:
+                    if not self.queue.empty():
+                        request = self.queue.get_nowait()
+                    else:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            request = await asyncio.wait_for(self.queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                    batch.append(request)
+                    size += len(request.texts)
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("Embedding service stopped"))
+                raise
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatch_tasks.add(task)
+            task.add_done_callback(self._dispatch_tasks.discard)
+
+    @staticmethod
+    def _fail(batch: List[EncodeRequest], error: BaseException):
+        for request in batch:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    async def _dispatch(self, batch: List[EncodeRequest]):
+        loop = asyncio.get_running_loop()
+        texts = [text for request in batch for text in request.texts]
+        started = time.perf_counter()
+        try:
+            embeddings = await loop.run_in_executor(self.executor, self._encode_batch, texts)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        finally:
+            self._slots.release()
+
+        finished = time.perf_counter()
+        self.batches_run += 1
+        self.texts_encoded += len(texts)
+        self.requests_served += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        self.total_encode_ms += (finished - started) * 1000
+
+        offset = 0
+        for request in batch:
+            count = len(request.texts)
+            vectors = embeddings[offset:offset + count]
+            offset += count
+            self.total_wait_ms += (started - request.enqueued_at) * 1000
+            if request.normalize:
+                vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+            if not request.future.done():
+                request.future.set_result(vectors)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return db_manager.embedding_model.encode(
+            texts, batch_size=self.max_batch_size, convert_to_numpy=True
+        ).astype(np.float32, copy=False)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "batches_run": self.batches_run,
+            "requests_served": self.requests_served,
+            "texts_encoded": self.texts_encoded,
+            "avg_batch_size": self.texts_encoded / self.batches_run if self.batches_run else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "avg_queue_wait_ms": self.total_wait_ms / self.requests_served if self.requests_served else 0.0,
+            "avg_encode_ms": self.total_encode_ms / self.batches_run if self.batches_run else 0.0,
+            "query_cache": self.query_cache.get_statistics()
+        }
+
+embedding_service = EmbeddingService()
@@ -1,5 +1,6 @@
 import asyncio
 import google.generativeai as genai
+from collections import OrderedDict
 from typing import List, Dict, Any
 import traceback
 from app.services.retrieval import SimpleRetriever
@@ -17,6 +18,9 @@ class GeminiSpeculativeRAG:
     def __init__(self):
         api_key = os.getenv("GEMINI_API_KEY")
         self.available = False
+        # Expansions are used by multi-interpretation retrieval and again for chunk selection
+        self.expansion_cache = OrderedDict()
+        self.expansion_cache_size = 256
         
         if api_key and api_key != "your_gemini_api_key_here":
             try:
@@ -37,6 +41,10 @@ class GeminiSpeculativeRAG:
         if not self.available:
             return [query]
         
+        if query in self.expansion_cache:
+            self.expansion_cache.move_to_end(query)
+            return self.expansion_cache[query]
+        
         try:
             model = genai.GenerativeModel(settings.drafter_model)
             prompt = f"""Generate 2 alternative phrasings of this query (one per line, no numbering):
@@ -50,7 +58,11 @@ Alternatives:"""
             )
             
             alternatives = [line.strip() for line in response.text.strip().split('\n') if line.strip() and len(line.strip()) > 10]
-            return [query] + alternatives[:2]
+            expanded = [query] + alternatives[:2]
+            self.expansion_cache[query] = expanded
+            while len(self.expansion_cache) > self.expansion_cache_size:
+                self.expansion_cache.popitem(last=False)
+            return expanded
         except:
             return [query]
     
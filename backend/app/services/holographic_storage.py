@@ -13,6 +13,7 @@ class HolographicStorage:
         self.dimensions = dimensions
         self.hologram_matrix = np.zeros((dimensions, dimensions), dtype=complex)
         self.reference_waves = {}  # doc_id -> reference wave
+        self.object_waves = {}  # doc_id -> object wave this process added to the hologram
         self.reconstruction_cache = {}
     
     def generate_reference_wave(self, doc_id: int, seed: int = None) -> np.ndarray:
@@ -50,10 +51,24 @@ class HolographicStorage:
         
         # Add to hologram (multiple documents can coexist)
         self.hologram_matrix += interference
+        self.object_waves[doc_id] = object_wave
         
         # Store in database
         await self._store_hologram_data(doc_id, interference)
     
+    async def update_document_hologram(self, doc_id: int, content_embedding: np.ndarray):
+        """
+        Replace a document's interference pattern without rebuilding the hologram.
+        Only the pattern this process added is removed - the stored one may have
+        been written by another process and never been part of this matrix.
+        """
+        old_object = self.object_waves.pop(doc_id, None)
+        if old_object is not None:
+            self.hologram_matrix -= np.outer(old_object, np.conj(self.reference_waves[doc_id]))
+        
+        self.reconstruction_cache.pop(doc_id, None)
+        await self.encode_document_hologram(doc_id, np.asarray(content_embedding))
+    
     async def reconstruct_document(self, doc_id: int) -> np.ndarray:
         """Reconstruct document from hologram using reference wave"""
         if doc_id in self.reconstruction_cache:
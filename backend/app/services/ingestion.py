@@ -1,156 +1,733 @@
 import re
 import asyncio
 import numpy as np
-import json
-from typing import List, Dict, Any
-from pypdf import PdfReader
-from docx import Document
+import hashlib
+import time
+import uuid
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Callable, Awaitable, Tuple
 from app.core.database import db_manager
 from app.core.config import settings
+from app.core.processes import spawn_process_pool
 from app.services.holographic_storage import holographic_storage
+from app.services.embedding_service import embedding_service
+from app.services.vector_index import local_vector_index
+from app.services.retrieval_cache import retrieval_cache
+from app.services.ingestion_jobs import DOCUMENT_INGESTED_CHANNEL, notify_document
+from app.services import document_parsing
+
+TEXT_BLOCK_LINES = 200  # paragraphs/lines per streamed block for DOCX and TXT
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+WORD = re.compile(r'\S+')
+# Stored chunk text is only needed for rows written before content hashes existed
+STORED_HASH_COLUMNS = "content_hash, CASE WHEN content_hash IS NULL THEN content END AS content"
+# documents.content joined from a stream's staged page text ($2 = stream id), in Postgres
+STAGED_CONTENT_SQL = (
+    "(SELECT coalesce(string_agg(content, '' ORDER BY seq), '') FROM document_pages WHERE stream_id = $2)"
+)
+
+def content_hash(text: str) -> str:
+    """Hash of whitespace-normalized text - the embedding cache key"""
+    return hashlib.sha256(" ".join(text.split()).encode('utf-8')).hexdigest()
+
+def chunk_metadata(span: Tuple[int, int]) -> Dict[str, Any]:
+    start, end = span
+    return {"chunk_type": "semantic", "char_start": start, "char_end": end}
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 class AgenticChunker:
     def __init__(self):
         self.min_chunk_size = 150
         self.max_chunk_size = 800
+        self.parse_executor = None
+        self.parse_timings = deque(maxlen=50)  # recent per-document parse stats
+        self.embedding_cache_hits = 0
+        self.embedding_cache_misses = 0
+    
+    def _get_parse_executor(self) -> Optional[ProcessPoolExecutor]:
+        if settings.parse_workers <= 0:
+            return None
+        if self.parse_executor is None:
+            self.parse_executor = spawn_process_pool(settings.parse_workers)
+        return self.parse_executor
+    
+    def shutdown(self):
+        if self.parse_executor:
+            self.parse_executor.shutdown(wait=False, cancel_futures=True)
+            self.parse_executor = None
     
     async def extract_text(self, file_path: str) -> str:
         """Extract text from PDF or DOCX files"""
+        return await asyncio.to_thread(lambda: "\n".join(self.iter_pages(file_path)))
+    
+    def iter_pages(self, file_path: str, stats: Dict[str, Any] = None) -> Iterator[str]:
+        """
+        Yield text page by page (paragraph/line blocks for DOCX and TXT).
+        PDF page ranges are parsed in the process pool, several ranges in flight
+        at once, and yielded back in page order. Blocks the calling thread, so
+        run it off the event loop.
+        """
+        stats = stats if stats is not None else {}
+        stats.update({"pages": 0, "tasks": 0, "worker_seconds": 0.0})
+        started = time.perf_counter()
+        executor = self._get_parse_executor()
+        
+        def run(fn, *args):
+            return executor.submit(fn, *args).result() if executor else fn(*args)
+        
         if file_path.endswith('.pdf'):
-            reader = PdfReader(file_path)
-            return "\n".join([(page.extract_text() or "") for page in reader.pages])
+            page_count = run(document_parsing.count_pdf_pages, file_path)
+            step = settings.parse_pages_per_task if settings.parse_split_pdfs else page_count
+            ranges = [(start, start + step) for start in range(0, page_count, max(step, 1))]
+            
+            if executor:
+                # Sliding window of in-flight ranges keeps memory bounded
+                window = settings.parse_workers * 2
+                pending = deque()
+                for start, end in ranges:
+                    pending.append(executor.submit(document_parsing.extract_pdf_pages, file_path, start, end))
+                    if len(pending) >= window:
+                        yield from self._collect_pages(pending.popleft().result(), stats)
+                while pending:
+                    yield from self._collect_pages(pending.popleft().result(), stats)
+            else:
+                for start, end in ranges:
+                    yield from self._collect_pages(
+                        document_parsing.extract_pdf_pages(file_path, start, end), stats
+                    )
         elif file_path.endswith('.docx'):
-            doc = Document(file_path)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            yield from self._collect_pages(
+                run(document_parsing.extract_docx_blocks, file_path, TEXT_BLOCK_LINES), stats
+            )
         else:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+                while True:
+                    block = list(islice(f, TEXT_BLOCK_LINES))
+                    if not block:
+                        break
+                    stats["pages"] += 1
+                    yield "".join(block)
+        
+        stats["parse_seconds"] = round(time.perf_counter() - started, 3)
+        stats["worker_seconds"] = round(stats["worker_seconds"], 3)
+    
+    def _collect_pages(self, result, stats: Dict[str, Any]) -> List[str]:
+        pages, elapsed = result
+        stats["pages"] += len(pages)
+        stats["tasks"] += 1
+        stats["worker_seconds"] += elapsed
+        return pages
+    
+    def iter_sentences(self, pages: Iterable[str]) -> Iterator[Tuple[str, int, int, str]]:
+        """
+        Yield (sentence, start, end, raw) across page boundaries, carrying the
+        unfinished tail forward. Offsets index into the pages joined with "\\n" -
+        exactly the text stored in documents.content.
+        """
+        carry, carry_start = "", 0
+        first = True
+        for page in pages:
+            buffer = page if first else carry + "\n" + page
+            first = False
+            position = 0
+            for separator in SENTENCE_BOUNDARY.finditer(buffer):
+                yield from self._sentence(buffer, position, separator.start(), carry_start)
+                position = separator.end()
+            # The last piece may continue on the next page
+            carry, carry_start = buffer[position:], carry_start + position
+            # Bound the carry when a stretch of text has no sentence terminators
+            if len(carry) > 4 * self.max_chunk_size:
+                yield from self._sentence(carry, 0, len(carry), carry_start)
+                carry, carry_start = "", carry_start + len(carry)
+        yield from self._sentence(carry, 0, len(carry), carry_start)
+    
+    @staticmethod
+    def _sentence(buffer: str, start: int, end: int, base: int) -> Iterator[Tuple[str, int, int, str]]:
+        """Trim buffer[start:end] to its non-whitespace span and normalize inner whitespace"""
+        words = WORD.search(buffer, start, end)
+        if words is None:
+            return
+        start = words.start()
+        while buffer[end - 1].isspace():
+            end -= 1
+        raw = buffer[start:end]
+        yield " ".join(raw.split()), base + start, base + end, raw
     
     def semantic_chunking(self, text: str) -> List[str]:
         """
         Improved semantic chunking with multiple strategies
         """
-        # Clean text first
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        if len(text) < self.min_chunk_size:
-            return [text] if text else []
-        
-        chunks = []
+        return [chunk for chunk, _, _ in self.iter_chunks(self.iter_sentences([text]))]
+    
+    def iter_chunks(self, sentences: Iterable[Tuple[str, int, int, str]]) -> Iterator[Tuple[str, int, int]]:
+        """
+        Group a sentence stream into (chunk, start, end), yielding each as soon as
+        it is complete. Single pass: pieces are only joined once per emitted chunk,
+        candidate sizes are tracked as running lengths.
+        """
+        emitted = False
+        seen = []  # only kept until the first chunk is emitted, for the fallback below
         
         # Strategy 1: Split by sentences first
-        sentences = re.split(r'(?<=[.!?])\s+', text)
-        current_chunk = ""
+        parts, length = [], 0  # current chunk as (text, start, end) pieces, joined length
         
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-                
+        for sentence, start, end, raw in sentences:
+            if not emitted:
+                seen.append((sentence, start, end))
+            
             # Check if adding this sentence exceeds max size
-            potential_chunk = current_chunk + " " + sentence if current_chunk else sentence
+            potential_length = length + 1 + len(sentence) if parts else len(sentence)
             
-            if len(potential_chunk) > self.max_chunk_size:
+            if potential_length > self.max_chunk_size:
                 # If current chunk is big enough, save it
-                if len(current_chunk) >= self.min_chunk_size:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence
+                if length >= self.min_chunk_size:
+                    yield self._join(parts)
+                    emitted, seen = True, []
+                    parts, length = [(sentence, start, end)], len(sentence)
                 else:
                     # If current chunk too small, force split the sentence
                     if len(sentence) > self.max_chunk_size:
                         # Split long sentence by words
-                        words = sentence.split()
-                        word_chunk = ""
-                        for word in words:
-                            if len(word_chunk + " " + word) > self.max_chunk_size:
-                                if len(word_chunk) >= self.min_chunk_size:
-                                    chunks.append(word_chunk.strip())
-                                word_chunk = word
-                            else:
-                                word_chunk += " " + word if word_chunk else word
-                        current_chunk = word_chunk
+                        parts, length = [], 0
+                        for word in WORD.finditer(raw):
+                            word_length = word.end() - word.start()
+                            if length + 1 + word_length > self.max_chunk_size:
+                                if length >= self.min_chunk_size:
+                                    yield self._join(parts)
+                                    emitted, seen = True, []
+                                parts, length = [], 0
+                            length += word_length + (1 if parts else 0)
+                            parts.append((word.group(), start + word.start(), start + word.end()))
                     else:
-                        current_chunk = potential_chunk
+                        parts.append((sentence, start, end))
+                        length = potential_length
             else:
-                current_chunk = potential_chunk
+                parts.append((sentence, start, end))
+                length = potential_length
         
         # Add the last chunk
-        if current_chunk.strip() and len(current_chunk) >= self.min_chunk_size:
-            chunks.append(current_chunk.strip())
+        if parts and length >= self.min_chunk_size:
+            yield self._join(parts)
+            emitted = True
         
-        # If no good chunks, create overlapping chunks
-        if not chunks and len(text) > self.min_chunk_size:
-            for i in range(0, len(text), self.max_chunk_size // 2):
-                chunk = text[i:i + self.max_chunk_size]
-                if len(chunk) >= self.min_chunk_size:
-                    chunks.append(chunk)
+        if emitted:
+            return
+        
+        text = " ".join(sentence for sentence, _, _ in seen)
+        if len(text) < self.min_chunk_size:
+            if text:
+                yield text, seen[0][1], seen[-1][2]
+            return
         
-        return chunks
+        # If no good chunks, create overlapping chunks; offsets cover the sentences each window touches
+        boundaries = []  # offset of each sentence in `text`
+        offset = 0
+        for sentence, _, _ in seen:
+            boundaries.append(offset)
+            offset += len(sentence) + 1
+        for i in range(0, len(text), self.max_chunk_size // 2):
+            chunk = text[i:i + self.max_chunk_size]
+            if len(chunk) >= self.min_chunk_size:
+                first = seen[bisect_right(boundaries, i) - 1]
+                last = seen[bisect_right(boundaries, i + len(chunk) - 1) - 1]
+                yield chunk, first[1], last[2]
+    
+    @staticmethod
+    def _join(parts: List[Tuple[str, int, int]]) -> Tuple[str, int, int]:
+        return " ".join(part for part, _, _ in parts), parts[0][1], parts[-1][2]
     
     def extract_metadata(self, text: str, filename: str) -> Dict[str, Any]:
         """Extract metadata for MAGMA graphs"""
         metadata = {"filename": filename}
-        
+        self.update_metadata(metadata, text)
+        return metadata
+    
+    def update_metadata(self, metadata: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """Fold one page of text into the document metadata"""
         # Extract authors (simple regex pattern)
         author_pattern = r'(?:Author[s]?|By):\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'
         authors = re.findall(author_pattern, text, re.IGNORECASE)
         if authors:
-            metadata["authors"] = authors
+            metadata.setdefault("authors", []).extend(authors)
         
         # Extract dates
         date_pattern = r'\b(?:19|20)\d{2}\b'
         dates = re.findall(date_pattern, text)
         if dates:
-            metadata["year"] = max(dates)  # Use most recent year
+            metadata["year"] = max(dates + [metadata.get("year", "")])  # Use most recent year
         
         # Extract institutions
         institution_pattern = r'University|Institute|Laboratory|College|School'
         institutions = re.findall(institution_pattern, text, re.IGNORECASE)
         if institutions:
-            metadata["institutions"] = list(set(institutions))
+            metadata["institutions"] = list(set(metadata.get("institutions", []) + institutions))
         
         return metadata
     
-    async def process_document(self, file_path: str) -> int:
-        """Process document and store in MAGMA system"""
-        text = await self.extract_text(file_path)
-        filename = file_path.split('\\')[-1] if '\\' in file_path else file_path.split('/')[-1]
-        metadata = self.extract_metadata(text, filename)
-        doc_embedding = db_manager.embedding_model.encode(text).tolist()
+    async def embed_chunks(self, chunks: List[str]) -> List[np.ndarray]:
+        """
+        Encode chunks through the embedding service in batches so query traffic can interleave.
+        Identical text (within the batch or seen before) reuses its cached vector.
+        """
+        if not chunks:
+            return []
+        
+        hashes = [content_hash(chunk) for chunk in chunks]
+        vectors = await self._lookup_cached_embeddings(set(hashes)) if settings.embedding_cache else {}
+        self.embedding_cache_hits += sum(1 for h in hashes if h in vectors)
+        
+        missing = {}  # hash -> text, de-duplicated
+        for h, chunk in zip(hashes, chunks):
+            if h not in vectors:
+                missing.setdefault(h, chunk)
+        
+        if missing:
+            missing_hashes = list(missing)
+            texts = [missing[h] for h in missing_hashes]
+            batch_size = settings.embedding_batch_size
+            fresh = {}
+            for start in range(0, len(texts), batch_size):
+                encoded = await embedding_service.encode(texts[start:start + batch_size])
+                fresh.update(zip(missing_hashes[start:start + batch_size], encoded))
+            self.embedding_cache_misses += len(fresh)
+            if settings.embedding_cache:
+                await self._store_cached_embeddings(fresh)
+            vectors.update(fresh)
         
-        # Store document
+        embeddings = [vectors[h] for h in hashes]
+        if settings.normalize_embeddings:
+            embeddings = [v / (np.linalg.norm(v) + 1e-12) for v in embeddings]
+        return embeddings
+    
+    async def _lookup_cached_embeddings(self, hashes: set) -> Dict[str, np.ndarray]:
+        async with db_manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT content_hash, embedding FROM embedding_cache WHERE model = $1 AND content_hash = ANY($2)",
+                settings.embedding_model, list(hashes)
+            )
+        return {row['content_hash']: row['embedding'] for row in rows}
+    
+    async def _store_cached_embeddings(self, vectors: Dict[str, np.ndarray]):
         async with db_manager.pg_pool.acquire() as conn:
-            doc_id = await conn.fetchval(
-                "INSERT INTO documents (filename, content, metadata) VALUES ($1, $2, $3) RETURNING id",
-                filename, text, json.dumps(metadata)
+            await conn.executemany(
+                "INSERT INTO embedding_cache (content_hash, model, embedding) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
+                [(h, settings.embedding_model, vector) for h, vector in vectors.items()]
             )
+    
+    def open_document(self, file_path: str) -> "DocumentStream":
+        return DocumentStream(self, file_path, settings.embedding_batch_size)
+    
+    async def process_document(self, file_path: str,
+                               progress: Callable[[int, int], Awaitable[None]] = None,
+                               created: Callable[[int], Awaitable[None]] = None) -> int:
+        """
+        Process document and store in MAGMA system, streaming pages in bounded batches.
+        `progress(pages_parsed, chunks_embedded)` is awaited after every batch, and
+        `created(doc_id)` once the (still unfinished) document row exists.
+        """
+        stream = self.open_document(file_path)
+        await self.create_document(stream)
+        if stream.duplicate:
+            return stream.doc_id
+        if created:
+            await created(stream.doc_id)
+        
+        try:
+            while True:
+                # Parse only as many pages as one batch needs, off the event loop
+                batch = await asyncio.to_thread(stream.next_batch)
+                if batch is None:
+                    break
+                chunks, offsets, page_text = batch
+                
+                # Encode before acquiring a connection so the pool isn't held during CPU work
+                chunk_embeddings = await self.embed_chunks(chunks)
+                await self.write_batch(stream, chunks, chunk_embeddings, offsets, page_text)
+                
+                if progress:
+                    await progress(stream.parse_stats.get("pages", 0), stream.chunk_count)
+        except Exception:
+            await self.discard_document(stream)
+            raise
+        
+        await self.finalize_document(stream)
+        return stream.doc_id
+    
+    async def create_document(self, stream: "DocumentStream") -> int:
+        """
+        Insert the document row, or point at the existing one if this exact file was ingested.
+        The file hash is only stored by finalize_document, so unfinished documents never match.
+        """
+        stream.file_hash = await asyncio.to_thread(file_hash, stream.file_path)
+        async with db_manager.pg_pool.acquire() as conn:
+            if settings.dedupe_documents:
+                existing_id = await conn.fetchval(
+                    "SELECT id FROM documents WHERE file_hash = $1 ORDER BY id LIMIT 1", stream.file_hash
+                )
+                if existing_id is not None:
+                    stream.doc_id = existing_id
+                    stream.duplicate = True
+                    return existing_id
             
-            # Chunk and store
-            chunks = self.semantic_chunking(text)
-            for i, chunk in enumerate(chunks):
-                embedding = db_manager.embedding_model.encode(chunk).tolist()
-                # Convert embedding to string format for PostgreSQL vector
-                embedding_vector = '[' + ','.join(map(str, embedding)) + ']'
-                chunk_id = await conn.fetchval(
-                    "INSERT INTO chunks (document_id, content, embedding, chunk_index, metadata) VALUES ($1, $2, $3::vector, $4, $5) RETURNING id",
-                    doc_id, chunk, embedding_vector, i, json.dumps({"chunk_type": "semantic"})
+            stream.doc_id = await conn.fetchval(
+                "INSERT INTO documents (filename, content, metadata) VALUES ($1, '', $2) RETURNING id",
+                stream.filename, stream.metadata
+            )
+        return stream.doc_id
+    
+    async def write_batch(self, stream: "DocumentStream", chunks: List[str],
+                          chunk_embeddings: List[np.ndarray], offsets: List[Tuple[int, int]],
+                          page_text: str):
+        """
+        Append one batch of chunks and stage its page text. `offsets` are each chunk's
+        (start, end) characters in documents.content, which finalize_document
+        assembles from the staged pages.
+        """
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                if chunks:
+                    # Binary COPY - embeddings go over the wire through the vector codec
+                    records = [
+                        (stream.doc_id, chunk, embedding, stream.chunk_count + i,
+                         chunk_metadata(span), content_hash(chunk))
+                        for i, (chunk, embedding, span) in enumerate(zip(chunks, chunk_embeddings, offsets))
+                    ]
+                    await conn.copy_records_to_table(
+                        'chunks', records=records,
+                        columns=['document_id', 'content', 'embedding', 'chunk_index', 'metadata', 'content_hash']
+                    )
+                await self.stage_pages(conn, stream, page_text)
+        
+        stream.chunk_count += len(chunks)
+        if chunk_embeddings:
+            batch_sum = np.sum(chunk_embeddings, axis=0)
+            stream.embedding_sum = batch_sum if stream.embedding_sum is None else stream.embedding_sum + batch_sum
+    
+    async def stage_pages(self, conn, stream: "DocumentStream", page_text: str):
+        """Stage one batch of page text; documents.content is joined from these rows in Postgres"""
+        if page_text:
+            await conn.execute(
+                "INSERT INTO document_pages (stream_id, document_id, seq, content) VALUES ($1, $2, $3, $4)",
+                stream.stream_id, stream.doc_id, stream.batch_count, page_text
+            )
+            stream.batch_count += 1
+    
+    async def discard_staged(self, stream: "DocumentStream"):
+        """Drop the rows a stream staged; a crashed process leaves them to the startup sweep"""
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM document_pages WHERE stream_id = $1", stream.stream_id)
+                await conn.execute("DELETE FROM chunk_staging WHERE stream_id = $1", stream.stream_id)
+    
+    async def discard_document(self, stream: "DocumentStream"):
+        """Don't leave a half-ingested document behind"""
+        if stream.doc_id is None or stream.duplicate:
+            return
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM document_pages WHERE stream_id = $1", stream.stream_id)
+                await conn.execute("DELETE FROM chunks WHERE document_id = $1", stream.doc_id)
+                await conn.execute("DELETE FROM documents WHERE id = $1", stream.doc_id)
+    
+    async def discard_partial_document(self, doc_id: int) -> bool:
+        """Delete a document an interrupted ingestion left unfinished; finished documents are kept"""
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                unfinished = await conn.fetchval(
+                    "SELECT 1 FROM documents WHERE id = $1 AND file_hash IS NULL FOR UPDATE", doc_id
                 )
-                
-                # Store chunk in Neo4j graph (disabled temporarily)
-                # if db_manager.neo4j_driver:
-                #     with db_manager.neo4j_driver.session() as session:
-                #         session.run("""
-                #             MERGE (d:Document {id: $doc_id})
-                #             SET d.filename = $filename, d.metadata = $metadata
-                #             MERGE (c:Chunk {id: $chunk_id})
-                #             SET c.document_id = $doc_id, c.chunk_index = $chunk_index
-                #             MERGE (d)-[:CONTAINS]->(c)
-                #         """, doc_id=doc_id, filename=filename, metadata=json.dumps(metadata),
-                #            chunk_id=chunk_id, chunk_index=i)
+                if not unfinished:
+                    return False
+                await conn.execute("""
+                    DELETE FROM neuromorphic_synapses
+                    WHERE chunk_id IN (SELECT id FROM chunks WHERE document_id = $1)
+                """, doc_id)
+                await conn.execute("DELETE FROM document_pages WHERE document_id = $1", doc_id)
+                await conn.execute("DELETE FROM chunks WHERE document_id = $1", doc_id)
+                await conn.execute("DELETE FROM documents WHERE id = $1", doc_id)
+        return True
+    
+    async def finalize_document(self, stream: "DocumentStream"):
+        doc_id = stream.doc_id
+        self.parse_timings.append(stream.parse_stats)
+        stream.metadata["parse_stats"] = {
+            key: value for key, value in stream.parse_stats.items() if key != "filename"
+        }
+        
+        # Document vector: mean of chunk embeddings, accumulated in constant memory.
+        # Stored on documents for coarse-to-fine retrieval.
+        doc_embedding = stream.embedding_sum / stream.chunk_count if stream.embedding_sum is not None else None
+        
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                # Setting the file hash marks the document finished - only now can uploads dedupe against it
+                await conn.execute(f"""
+                    UPDATE documents SET content = {STAGED_CONTENT_SQL}, metadata = $3, embedding = $4, file_hash = $5
+                    WHERE id = $1
+                """, doc_id, stream.stream_id, stream.metadata, doc_embedding, stream.file_hash)
+                await conn.execute("DELETE FROM document_pages WHERE stream_id = $1", stream.stream_id)
+        
+        # Store chunk graph in Neo4j (disabled temporarily)
+        # if db_manager.neo4j_driver:
+        #     with db_manager.neo4j_driver.session() as session:
+        #         session.run("""
+        #             MERGE (d:Document {id: $doc_id})
+        #             SET d.filename = $filename, d.metadata = $metadata
+        #             MERGE (c:Chunk {id: $chunk_id})
+        #             SET c.document_id = $doc_id, c.chunk_index = $chunk_index
+        #             MERGE (d)-[:CONTAINS]->(c)
+        #         """, doc_id=doc_id, filename=filename, metadata=json.dumps(metadata),
+        #            chunk_id=chunk_id, chunk_index=i)
+        
+        if doc_embedding is None:
+            doc_embedding = np.zeros(holographic_storage.dimensions, dtype=np.float32)
         
         # Store holographic representation of document
-        await holographic_storage.encode_document_hologram(doc_id, np.array(doc_embedding))
+        await holographic_storage.encode_document_hologram(doc_id, doc_embedding)
+        
+        # Keep the in-process vector index in sync
+        await local_vector_index.add_document(doc_id)
+        retrieval_cache.bump_corpus_version()
+        await self.announce_document(doc_id)
+    
+    async def announce_document(self, doc_id: int):
+        """Let every API process mirror the changed document (local vector index, caches)"""
+        async with db_manager.pg_pool.acquire() as conn:
+            await notify_document(conn, DOCUMENT_INGESTED_CHANNEL, doc_id)
+
+    async def update_document(self, doc_id: int, file_path: str,
+                              progress: Callable[[int, int], Awaitable[None]] = None) -> Dict[str, Any]:
+        """
+        Re-ingest a revised document incrementally: the new chunk sequence is diffed
+        against the stored chunks by content hash. Unchanged chunks keep their ids
+        (and their neuromorphic synapses), only new text is embedded, and only
+        chunks that disappeared are deleted. The new chunks and page text are staged
+        while parsing; all writes to the document land in one transaction.
+        """
+        new_hash = await asyncio.to_thread(file_hash, file_path)
+        async with db_manager.pg_pool.acquire() as conn:
+            stored = await conn.fetchrow("SELECT file_hash FROM documents WHERE id = $1", doc_id)
+            if stored is None:
+                raise ValueError(f"Document {doc_id} not found")
+            if stored['file_hash'] == new_hash:
+                # Same bytes as what is stored: nothing to lock, reload or announce
+                chunk_count = await conn.fetchval("SELECT COUNT(*) FROM chunks WHERE document_id = $1", doc_id)
+                return {
+                    "document_id": doc_id,
+                    "chunks": chunk_count,
+                    "kept": chunk_count,
+                    "added": 0,
+                    "removed": 0,
+                    "reindexed": 0
+                }
+            rows = await conn.fetch(
+                f"SELECT {STORED_HASH_COLUMNS} FROM chunks WHERE document_id = $1", doc_id
+            )
+        
+        # Stored text we expect to reuse; the diff itself happens under the row lock below
+        available = {}
+        for row in rows:
+            h = row['content_hash'] or content_hash(row['content'])
+            available[h] = available.get(h, 0) + 1
+        
+        stream = self.open_document(file_path)
+        stream.doc_id = doc_id
+        stream.file_hash = new_hash
+        sequence = []  # (hash, metadata) in new document order; the text itself is staged
+        
+        try:
+            # Phase 1: parse, embed only the new text and stage every chunk - no lock held
+            while True:
+                batch = await asyncio.to_thread(stream.next_batch)
+                if batch is None:
+                    break
+                chunks, offsets, page_text = batch
+                
+                fresh = []  # batch positions whose text isn't stored yet
+                hashes = [content_hash(chunk) for chunk in chunks]
+                for i, (h, span) in enumerate(zip(hashes, offsets)):
+                    sequence.append((h, chunk_metadata(span)))
+                    if available.get(h):
+                        available[h] -= 1
+                    else:
+                        fresh.append(i)
+                vectors = dict(zip(fresh, await self.embed_chunks([chunks[i] for i in fresh])))
+                
+                async with db_manager.pg_pool.acquire() as conn:
+                    async with conn.transaction():
+                        if chunks:
+                            await conn.copy_records_to_table(
+                                'chunk_staging', records=[
+                                    (stream.stream_id, stream.chunk_count + i, chunk, h,
+                                     chunk_metadata(span), vectors.get(i))
+                                    for i, (chunk, h, span) in enumerate(zip(chunks, hashes, offsets))
+                                ],
+                                columns=['stream_id', 'chunk_index', 'content', 'content_hash', 'metadata', 'embedding']
+                            )
+                        await self.stage_pages(conn, stream, page_text)
+                stream.chunk_count += len(chunks)
+                
+                if progress:
+                    await progress(stream.parse_stats.get("pages", 0), stream.chunk_count)
+            
+            stream.metadata["parse_stats"] = {
+                key: value for key, value in stream.parse_stats.items() if key != "filename"
+            }
+            self.parse_timings.append(stream.parse_stats)
+            
+            # Phase 2: lock the document, diff against its current chunks and apply atomically.
+            # A concurrent update of the same document waits here and then diffs against our result.
+            async with db_manager.pg_pool.acquire() as conn:
+                async with conn.transaction():
+                    if not await conn.fetchval("SELECT 1 FROM documents WHERE id = $1 FOR UPDATE", doc_id):
+                        raise ValueError(f"Document {doc_id} not found")
+                    rows = await conn.fetch(
+                        f"SELECT id, chunk_index, metadata, {STORED_HASH_COLUMNS} FROM chunks WHERE document_id = $1 ORDER BY chunk_index",
+                        doc_id
+                    )
+                    
+                    # content hash -> stored chunk ids (the same text can appear more than once)
+                    existing = {}
+                    for row in rows:
+                        existing.setdefault(row['content_hash'] or content_hash(row['content']), deque()).append(
+                            (row['id'], row['chunk_index'], row['metadata'] or {})
+                        )
+                    
+                    reindexed = []   # (chunk_id, new_index, metadata) for kept chunks that moved
+                    added = []       # new chunk indexes, copied over from chunk_staging
+                    for index, (h, metadata) in enumerate(sequence):
+                        matches = existing.get(h)
+                        if matches:
+                            chunk_id, old_index, old_metadata = matches.popleft()
+                            # Unchanged text can still shift within the document
+                            if old_index != index or old_metadata != metadata:
+                                reindexed.append((chunk_id, index, {**old_metadata, **metadata}))
+                        else:
+                            added.append(index)
+                    removed = [chunk_id for matches in existing.values() for chunk_id, _, _ in matches]
+                    
+                    # Only when another update removed text we planned to keep since phase 1
+                    missing = await conn.fetch("""
+                        SELECT chunk_index, content FROM chunk_staging
+                        WHERE stream_id = $1 AND chunk_index = ANY($2) AND embedding IS NULL
+                    """, stream.stream_id, added) if added else []
+                    if missing:
+                        embeddings = await self.embed_chunks([row['content'] for row in missing])
+                        await conn.executemany(
+                            "UPDATE chunk_staging SET embedding = $3 WHERE stream_id = $1 AND chunk_index = $2",
+                            [(stream.stream_id, row['chunk_index'], embedding)
+                             for row, embedding in zip(missing, embeddings)]
+                        )
+                    
+                    if removed:
+                        await conn.execute("DELETE FROM neuromorphic_synapses WHERE chunk_id = ANY($1)", removed)
+                        await conn.execute("DELETE FROM chunks WHERE id = ANY($1)", removed)
+                    if reindexed:
+                        await conn.executemany(
+                            "UPDATE chunks SET chunk_index = $2, metadata = $3 WHERE id = $1", reindexed
+                        )
+                    if added:
+                        await conn.execute("""
+                            INSERT INTO chunks (document_id, content, embedding, chunk_index, metadata, content_hash)
+                            SELECT $1, content, embedding, chunk_index, metadata, content_hash
+                            FROM chunk_staging WHERE stream_id = $2 AND chunk_index = ANY($3)
+                        """, doc_id, stream.stream_id, added)
+                    await conn.execute(f"""
+                        UPDATE documents SET filename = $3, content = {STAGED_CONTENT_SQL}, metadata = $4, file_hash = $5
+                        WHERE id = $1
+                    """, doc_id, stream.stream_id, stream.filename, stream.metadata, stream.file_hash)
+                    
+                    # Document vector: mean of the stored chunk embeddings, computed in Postgres
+                    doc_embedding = await conn.fetchval("""
+                        UPDATE documents
+                        SET embedding = (SELECT avg(embedding) FROM chunks WHERE document_id = $1)
+                        WHERE id = $1
+                        RETURNING embedding
+                    """, doc_id)
+        finally:
+            await self.discard_staged(stream)
+        
+        if doc_embedding is None:
+            doc_embedding = np.zeros(holographic_storage.dimensions, dtype=np.float32)
+        
+        # Swap this document's interference pattern in the hologram
+        await holographic_storage.update_document_hologram(doc_id, doc_embedding)
+        
+        # Keep the in-process vector index in sync
+        await local_vector_index.reload_document(doc_id)
+        retrieval_cache.bump_corpus_version()
+        await self.announce_document(doc_id)
+        
+        return {
+            "document_id": doc_id,
+            "chunks": stream.chunk_count,
+            "kept": len(sequence) - len(added),
+            "added": len(added),
+            "removed": len(removed),
+            "reindexed": len(reindexed)
+        }
+
+class DocumentStream:
+    """
+    A lazily parsed document. next_batch() parses just enough pages for one
+    batch of chunks and returns (chunks, offsets, page_text), or None when exhausted.
+    It blocks on parsing, so call it off the event loop. page_text is the slice of
+    documents.content parsed since the previous batch; it is staged per batch and
+    joined in Postgres, so the full text is never held in the process.
+    """
+    
+    def __init__(self, chunker: AgenticChunker, file_path: str, batch_size: int):
+        self.file_path = file_path
+        self.filename = file_path.split('\\')[-1] if '\\' in file_path else file_path.split('/')[-1]
+        self.batch_size = batch_size
+        self.metadata = {"filename": self.filename}
+        self.parse_stats = {"filename": self.filename}
+        self.stream_id = uuid.uuid4().hex  # key of this stream's staged rows
+        self.doc_id = None
+        self.chunk_count = 0
+        self.batch_count = 0
+        self.embedding_sum = None
+        self.file_hash = None
+        self.duplicate = False
+        self.error = None
+        self._page_buffer = []  # raw page text not yet handed out with a batch
+        self._content_started = False
+        self._exhausted = False
+        self._chunker = chunker
+        self._chunks = chunker.iter_chunks(chunker.iter_sentences(self._pages()))
+    
+    def _pages(self) -> Iterator[str]:
+        for page in self._chunker.iter_pages(self.file_path, self.parse_stats):
+            self._chunker.update_metadata(self.metadata, page)
+            self._page_buffer.append(page)
+            yield page
+    
+    def next_batch(self) -> Optional[Tuple[List[str], List[Tuple[int, int]], str]]:
+        if self._exhausted:
+            return None
+        batch = list(islice(self._chunks, self.batch_size))
+        chunks = [chunk for chunk, _, _ in batch]
+        offsets = [(start, end) for _, start, end in batch]
+        if not chunks:
+            self._exhausted = True
+            # Trailing pages that produced no chunk still belong to documents.content
+            if not self._page_buffer:
+                return None
         
-        return doc_id
+        page_text = "\n".join(self._page_buffer)
+        if self._content_started and self._page_buffer:
+            page_text = "\n" + page_text
+        self._content_started = self._content_started or bool(self._page_buffer)
+        self._page_buffer.clear()
+        return chunks, offsets, page_text
 
 chunker = AgenticChunker()
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import socket
+from typing import Dict, Any, Optional, Tuple
+from app.core.database import db_manager
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_INGESTED_CHANNEL = "document_ingested"
+DOCUMENT_DELETED_CHANNEL = "document_deleted"
+
+def process_token() -> str:
+    """Names this process in document notifications - read per call so forked workers differ"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+async def notify_document(conn, channel: str, doc_id: int):
+    """Announce a changed document to every API process; the sender has already applied it"""
+    await conn.execute("SELECT pg_notify($1, $2)", channel, f"{process_token()}/{doc_id}")
+
+def parse_document_notification(payload: str) -> Tuple[int, bool]:
+    """(document id, whether this process sent it) from a notify_document payload"""
+    sender, _, doc_id = payload.rpartition("/")
+    return int(doc_id), sender == process_token()
+
+class IngestionJobQueue:
+    """
+    Postgres-backed ingestion queue. Any number of workers (in the API process
+    or standalone via `python -m app.workers.ingestion_worker`) claim jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so ingestion scales independently of queries.
+    """
+
+    async def enqueue(self, filename: str, file_path: str, target_document_id: int = None) -> int:
+        """Queue a new document, or an incremental update of `target_document_id`"""
+        async with db_manager.pg_pool.acquire() as conn:
+            return await conn.fetchval(
+                "INSERT INTO ingestion_jobs (filename, file_path, target_document_id) VALUES ($1, $2, $3) RETURNING id",
+                filename, file_path, target_document_id
+            )
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        async with db_manager.pg_pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM ingestion_jobs WHERE id = $1", job_id)
+        if not row:
+            return None
+        job = dict(row)
+        for key in ("created_at", "started_at", "finished_at", "updated_at"):
+            job[key] = job[key].isoformat() if job[key] else None
+        return job
+
+    async def claim_next(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        async with db_manager.pg_pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                UPDATE ingestion_jobs
+                SET status = 'running', worker_id = $1, attempts = attempts + 1,
+                    started_at = NOW(), updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM ingestion_jobs
+                    WHERE status = 'queued'
+                    ORDER BY id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, filename, file_path, target_document_id, document_id
+            """, worker_id)
+        return dict(row) if row else None
+
+    async def update_progress(self, job_id: int, pages_parsed: int, chunks_embedded: int):
+        async with db_manager.pg_pool.acquire() as conn:
+            await conn.execute("""
+                UPDATE ingestion_jobs
+                SET pages_parsed = $2, chunks_embedded = $3, updated_at = NOW()
+                WHERE id = $1
+            """, job_id, pages_parsed, chunks_embedded)
+
+    async def set_document(self, job_id: int, document_id: int):
+        """Record the document a job is writing, so a retry can clean it up"""
+        async with db_manager.pg_pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE ingestion_jobs SET document_id = $2, updated_at = NOW() WHERE id = $1", job_id, document_id
+            )
+
+    async def complete(self, job_id: int, document_id: int):
+        async with db_manager.pg_pool.acquire() as conn:
+            await conn.execute("""
+                UPDATE ingestion_jobs
+                SET status = 'completed', document_id = $2, finished_at = NOW(), updated_at = NOW()
+                WHERE id = $1
+            """, job_id, document_id)
+
+    async def fail(self, job_id: int, error: str):
+        async with db_manager.pg_pool.acquire() as conn:
+            await conn.execute("""
+                UPDATE ingestion_jobs
+                SET status = 'failed', error = $2, finished_at = NOW(), updated_at = NOW()
+                WHERE id = $1
+            """, job_id, error)
+
+    async def requeue_stale(self) -> int:
+        """Put back jobs whose worker stopped reporting progress (crashed or killed)"""
+        async with db_manager.pg_pool.acquire() as conn:
+            result = await conn.execute("""
+                UPDATE ingestion_jobs SET status = 'queued', updated_at = NOW()
+                WHERE status = 'running'
+                  AND updated_at < NOW() - make_interval(secs => $1)
+                  AND attempts < $2
+            """, float(settings.ingestion_job_timeout), settings.ingestion_job_max_attempts)
+            await conn.execute("""
+                UPDATE ingestion_jobs
+                SET status = 'failed', error = 'Worker stopped reporting progress',
+                    finished_at = NOW(), updated_at = NOW()
+                WHERE status = 'running'
+                  AND updated_at < NOW() - make_interval(secs => $1)
+                  AND attempts >= $2
+            """, float(settings.ingestion_job_timeout), settings.ingestion_job_max_attempts)
+        return int(result.split()[-1])
+
+    async def run_job(self, job: Dict[str, Any]):
+        from app.services.ingestion import chunker
+
+        async def progress(pages_parsed: int, chunks_embedded: int):
+            await self.update_progress(job["id"], pages_parsed, chunks_embedded)
+
+        async def created(document_id: int):
+            await self.set_document(job["id"], document_id)
+
+        try:
+            if job["target_document_id"] is not None:
+                result = await chunker.update_document(job["target_document_id"], job["file_path"], progress=progress)
+                doc_id = result["document_id"]
+            else:
+                if job["document_id"] is not None:
+                    # A previous attempt died mid-ingestion; drop what it wrote before starting over
+                    if await chunker.discard_partial_document(job["document_id"]):
+                        logger.info(f"Ingestion job {job['id']}: removed partial document {job['document_id']}")
+                doc_id = await chunker.process_document(job["file_path"], progress=progress, created=created)
+        except Exception as e:
+            logger.error(f"Ingestion job {job['id']} failed: {e}")
+            await self.fail(job["id"], str(e))
+            return
+        await self.complete(job["id"], doc_id)
+
+    async def run_worker(self, worker_id: str = None, stop_event: asyncio.Event = None):
+        """Claim and process jobs until stopped"""
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        stop_event = stop_event or asyncio.Event()
+        logger.info(f"Ingestion worker {worker_id} started")
+
+        while not stop_event.is_set():
+            try:
+                await self.requeue_stale()
+                job = await self.claim_next(worker_id)
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_id} could not claim a job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), settings.ingestion_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.run_job(job)
+
+ingestion_queue = IngestionJobQueue()
@@ -15,91 +15,140 @@ class QuantumRetrieval:
     def get_coherence(self) -> float:
         return self.coherence
     
-    async def retrieve(self, query: str, max_results: int = 15, document_ids: List[int] = None) -> List[Chunk]:
-        """Quantum-inspired retrieval"""
+    async def retrieve(self, query: str, max_results: int = 15, document_ids: List[int] = None,
+                       search_params: Dict[str, int] = None, candidates: List[Chunk] = None,
+                       alternative_queries: List[str] = None) -> List[Chunk]:
+        """
+        Quantum-inspired retrieval. `candidates` are pre-fetched retrieval results
+        (from a batch query) used instead of running the search again.
+        With `alternative_queries` (paraphrases of the query), every interpretation
+        retrieves candidates and all of them interfere in the final state.
+        """
         from app.services.retrieval import SimpleRetriever
-        from app.core.database import db_manager
+        from app.services.embedding_service import embedding_service
         
-        retriever = SimpleRetriever()
-        chunks = await retriever.retrieve(query, max_results * 2, document_ids)
+        queries = [query] + [alt for alt in (alternative_queries or []) if alt != query]
+        
+        if candidates is not None:
+            chunks = candidates
+        elif len(queries) > 1:
+            # One batched encode and SQL round trip for all interpretations; union the candidates
+            results = await SimpleRetriever().retrieve_batch(queries, max_results * 2, document_ids, search_params)
+            unique = {}
+            for hits in results:
+                for chunk in hits:
+                    unique.setdefault(chunk.id, chunk)
+            chunks = list(unique.values())
+        else:
+            retriever = SimpleRetriever()
+            chunks = await retriever.retrieve(query, max_results * 2, document_ids, search_params)
         
         if not chunks:
             return []
         
-        # Quantum superposition scoring
-        query_embedding = db_manager.embedding_model.encode(query)
-        quantum_state = self.create_quantum_state(chunks, query_embedding)
-        rankings = self.measure_quantum_state(quantum_state)
+        # Quantum superposition scoring - stored chunk vectors come back with the retrieval
+        if len(queries) > 1:
+            query_embeddings = np.stack(await embedding_service.encode_queries(queries))
+            matrix = await self.embedding_matrix(chunks, query_embeddings.shape[1])
+            states = self.create_quantum_states(matrix, query_embeddings)
+            quantum_state = self.quantum_interference(states[0], states[1:])
+        else:
+            query_embedding = await embedding_service.encode_query(query)
+            quantum_state = await self.create_quantum_state(chunks, query_embedding)
+        rankings = self.measure_quantum_state(quantum_state, top_k=max_results)
         
         # Update coherence
         self.coherence = min(0.85 + len(chunks) * 0.01, 0.95)
         
-        return [chunks[idx] for idx, prob in rankings[:max_results] if prob > 0.01]
+        return [chunks[idx] for idx, prob in rankings if prob > 0.01]
+    
+    async def embedding_matrix(self, chunks: List[Chunk], dimensions: int) -> np.ndarray:
+        """Stack chunk embeddings into one (chunks x dimensions) float32 matrix"""
+        # Generate embeddings if not available - one batched encode through the embedding service
+        from app.services.embedding_service import embedding_service
+        await embedding_service.ensure_chunk_embeddings(chunks)
+        return self.stack_embeddings(chunks, dimensions)
+    
+    @staticmethod
+    def stack_embeddings(chunks: List[Chunk], dimensions: int) -> np.ndarray:
+        """Chunks that already carry embeddings, as a (chunks x dimensions) float32 matrix"""
+        matrix = np.zeros((len(chunks), dimensions), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            # Ensure same dimensions: truncate, or zero-pad shorter vectors
+            embedding = np.asarray(chunk.embedding, dtype=np.float32)[:dimensions]
+            matrix[i, :len(embedding)] = embedding
+        return matrix
     
-    def create_quantum_state(self, chunks: List[Chunk], query_embedding: np.ndarray) -> np.ndarray:
+    async def create_quantum_state(self, chunks: List[Chunk], query_embedding: np.ndarray) -> np.ndarray:
         """Create quantum superposition state for all chunks"""
-        n_chunks = len(chunks)
-        if n_chunks == 0:
+        if len(chunks) == 0:
             return np.array([])
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        matrix = await self.embedding_matrix(chunks, len(query_embedding))
+        return self.quantum_state_from_matrix(matrix, query_embedding)
+    
+    def quantum_state_from_matrix(self, matrix: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+        """Amplitudes for every chunk row at once: one matvec, vectorized phase and magnitude"""
+        return self.create_quantum_states(matrix, query_embedding[np.newaxis, :])[0]
+    
+    def create_quantum_states(self, matrix: np.ndarray, query_embeddings: np.ndarray) -> np.ndarray:
+        """(queries x chunks) complex states - one matmul for every query interpretation"""
+        similarity = (query_embeddings @ matrix.T) / (
+            np.linalg.norm(query_embeddings, axis=1, keepdims=True) * np.linalg.norm(matrix, axis=1) + 1e-8)
         
-        # Create amplitude vector (quantum state)
-        amplitudes = np.zeros(n_chunks, dtype=complex)
-        
-        for i, chunk in enumerate(chunks):
-            # Convert similarity to quantum amplitude
-            if hasattr(chunk, 'embedding') and chunk.embedding:
-                chunk_embedding = np.array(chunk.embedding)
-            else:
-                # Generate embedding if not available
-                from app.core.database import db_manager
-                chunk_embedding = db_manager.embedding_model.encode(chunk.content)
-            
-            # Ensure same dimensions
-            if len(chunk_embedding) != len(query_embedding):
-                chunk_embedding = chunk_embedding[:len(query_embedding)]  # Truncate if needed
-                if len(chunk_embedding) < len(query_embedding):
-                    chunk_embedding = np.pad(chunk_embedding, (0, len(query_embedding) - len(chunk_embedding)))
-            
-            similarity = np.dot(query_embedding, chunk_embedding) / (np.linalg.norm(query_embedding) * np.linalg.norm(chunk_embedding) + 1e-8)
-            phase = np.pi * similarity  # Phase encoding
-            amplitudes[i] = np.sqrt(abs(similarity)) * np.exp(1j * phase)
+        # Convert similarity to quantum amplitude - phase encoding
+        amplitudes = np.sqrt(np.abs(similarity)) * np.exp(1j * np.pi * similarity)
         
-        # Normalize to unit vector (quantum constraint)
-        norm = np.linalg.norm(amplitudes)
-        return amplitudes / norm if norm > 0 else amplitudes
+        # Normalize each state to unit vector (quantum constraint)
+        norms = np.linalg.norm(amplitudes, axis=1, keepdims=True)
+        return np.divide(amplitudes, norms, out=amplitudes, where=norms > 0)
     
     def quantum_interference(self, state1: np.ndarray, state2: np.ndarray) -> np.ndarray:
-        """Apply quantum interference between different query interpretations"""
-        if len(state1) != len(state2):
+        """
+        Apply quantum interference between different query interpretations.
+        `state2` is one state or a (interpretations x chunks) matrix of them,
+        all superposed with the same relative phase in one pass.
+        """
+        if state1.shape[-1] != state2.shape[-1]:
             return state1
+        if state2.ndim > 1:
+            state2 = state2.sum(axis=0)
         
         # Constructive/destructive interference
         interference = state1 + state2 * np.exp(1j * np.pi/4)
-        return interference / np.linalg.norm(interference)
+        norm = np.linalg.norm(interference)
+        return interference / norm if norm > 0 else interference
     
-    def measure_quantum_state(self, quantum_state: np.ndarray) -> List[Tuple[int, float]]:
-        """Collapse quantum state to get probability rankings"""
+    def measure_quantum_state(self, quantum_state: np.ndarray, top_k: int = None) -> List[Tuple[int, float]]:
+        """Collapse quantum state to get probability rankings, optionally just the top k"""
         probabilities = np.abs(quantum_state) ** 2
         
-        # Sort by probability (Born rule)
-        ranked_indices = np.argsort(probabilities)[::-1]
-        return [(idx, probabilities[idx]) for idx in ranked_indices]
+        # Sort by probability (Born rule) - partial selection when only the top k are needed
+        if top_k is not None and top_k < len(probabilities):
+            top = np.argpartition(-probabilities, top_k - 1)[:top_k] if top_k > 0 else np.array([], dtype=int)
+            ranked_indices = top[np.argsort(-probabilities[top])]
+        else:
+            ranked_indices = np.argsort(-probabilities)
+        return [(int(idx), float(probabilities[idx])) for idx in ranked_indices]
     
     async def quantum_retrieve(self, chunks: List[Chunk], query_embedding: np.ndarray, 
                               alternative_queries: List[np.ndarray] = None) -> List[Chunk]:
         """Main quantum retrieval with superposition and interference"""
         
-        # Create primary quantum state
-        primary_state = self.create_quantum_state(chunks, query_embedding)
+        if len(chunks) == 0:
+            return []
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        matrix = await self.embedding_matrix(chunks, len(query_embedding))
         
         if alternative_queries:
-            # Create superposition of multiple query interpretations
-            combined_state = primary_state
-            for alt_query in alternative_queries:
-                alt_state = self.create_quantum_state(chunks, alt_query)
-                combined_state = self.quantum_interference(combined_state, alt_state)
+            # Superposition of all query interpretations: states for every query in one matmul
+            queries = np.vstack([query_embedding] + [
+                np.asarray(alt, dtype=np.float32)[:len(query_embedding)] for alt in alternative_queries
+            ])
+            states = self.create_quantum_states(matrix, queries)
+            combined_state = self.quantum_interference(states[0], states[1:])
         else:
-            combined_state = primary_state
+            combined_state = self.quantum_state_from_matrix(matrix, query_embedding)
         
         # Measure quantum state to get rankings
         rankings = self.measure_quantum_state(combined_state)
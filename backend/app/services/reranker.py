@@ -0,0 +1,122 @@
+import asyncio
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+from app.core.config import settings
+from app.models.schemas import Chunk
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """
+    Optional CPU cross-encoder stage: scores (query, chunk) pairs in batches on a
+    dedicated thread pool and keeps the top few for generation. A latency budget
+    bounds the work - the candidate list (already ranked by earlier stages) is
+    cut to what fits, and scoring stops at the deadline.
+    """
+
+    def __init__(self):
+        self.model = None
+        self.executor = None
+        self.pair_ms = None  # moving average of scoring cost per pair
+
+        # Metrics
+        self.calls = 0
+        self.pairs_scored = 0
+        self.candidates_truncated = 0
+        self.deadline_stops = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=settings.reranker_workers, thread_name_prefix="reranker")
+        return self.executor
+
+    def _load_model(self):
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(settings.reranker_model, device="cpu")
+            logger.info(f"Cross-encoder loaded: {settings.reranker_model}")
+        return self.model
+
+    async def warmup(self):
+        """Load the model off the event loop, so loading never counts against a query's budget"""
+        await asyncio.get_running_loop().run_in_executor(self._get_executor(), self._load_model)
+
+    def _score(self, query: str, contents: List[str]) -> np.ndarray:
+        model = self._load_model()
+        return np.asarray(model.predict(
+            [(query, content) for content in contents],
+            batch_size=settings.reranker_batch_size, show_progress_bar=False
+        ), dtype=np.float32)
+
+    async def rerank(self, query: str, chunks: List[Chunk], top_k: int = None,
+                     budget_ms: float = None) -> List[Chunk]:
+        """Return the `top_k` chunks by cross-encoder score, within `budget_ms`"""
+        top_k = top_k or settings.reranker_top_k
+        budget_ms = budget_ms if budget_ms is not None else settings.reranker_budget_ms
+        if not chunks:
+            return []
+        if self.model is None:
+            await self.warmup()
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000
+
+        # Truncate up front to what the budget can score, best candidates first
+        limit = len(chunks)
+        if self.pair_ms:
+            limit = max(top_k, int(budget_ms / self.pair_ms))
+        candidates = chunks[:limit]
+        self.candidates_truncated += len(chunks) - len(candidates)
+
+        batch_size = settings.reranker_batch_size
+        scores = []
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start:start + batch_size]
+            batch_started = time.perf_counter()
+            batch_scores = await loop.run_in_executor(
+                self._get_executor(), self._score, query, [chunk.content for chunk in batch]
+            )
+            scores.extend(batch_scores)
+            per_pair = (time.perf_counter() - batch_started) * 1000 / len(batch)
+            self.pair_ms = per_pair if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * per_pair
+            if time.perf_counter() >= deadline and start + batch_size < len(candidates):
+                # Out of budget: unscored candidates are dropped
+                self.deadline_stops += 1
+                self.candidates_truncated += len(candidates) - len(scores)
+                break
+
+        self.calls += 1
+        self.pairs_scored += len(scores)
+        self.total_ms += (time.perf_counter() - started) * 1000
+
+        scored = candidates[:len(scores)]
+        for chunk, score in zip(scored, scores):
+            chunk.rerank_score = float(score)
+        return sorted(scored, key=lambda chunk: chunk.rerank_score, reverse=True)[:top_k]
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.reranker,
+            "model": settings.reranker_model,
+            "loaded": self.model is not None,
+            "top_k": settings.reranker_top_k,
+            "budget_ms": settings.reranker_budget_ms,
+            "calls": self.calls,
+            "pairs_scored": self.pairs_scored,
+            "candidates_truncated": self.candidates_truncated,
+            "deadline_stops": self.deadline_stops,
+            "avg_pair_ms": self.pair_ms or 0.0,
+            "avg_latency_ms": self.total_ms / self.calls if self.calls else 0.0
+        }
+
+reranker = CrossEncoderReranker()
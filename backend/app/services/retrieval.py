@@ -1,59 +1,333 @@
 import asyncio
-import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from rank_bm25 import BM25Okapi
 import numpy as np
 from app.core.database import db_manager
+from app.core.config import settings
+from app.services.embedding_service import embedding_service
+from app.services.vector_index import local_vector_index
+from app.services.retrieval_cache import retrieval_cache
 from app.models.schemas import Chunk
 
 class SimpleRetriever:
-    """Hybrid retrieval with vector + BM25 for better accuracy"""
+    """Hybrid retrieval: pgvector search + corpus-wide full-text search fused with RRF"""
     
-    async def retrieve(self, query: str, max_results: int = 10, document_ids: List[int] = None) -> List[Chunk]:
+    async def retrieve(self, query: str, max_results: int = 10, document_ids: List[int] = None,
+                       search_params: Dict[str, int] = None) -> List[Chunk]:
         doc_filter = document_ids or getattr(self, 'document_ids', None)
+        search_params = search_params or {}
         
-        # Step 1: Vector search - get more candidates
-        query_embedding = db_manager.embedding_model.encode(query)
-        query_vector = '[' + ','.join(map(str, query_embedding)) + ']'
+        query_embedding = await embedding_service.encode_query(query, normalize=settings.normalize_embeddings)
         
+        # Repeated queries against an unchanged corpus skip the search entirely
+        cache_key = retrieval_cache.make_key(query_embedding, doc_filter, max_results, search_params)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        corpus_version = retrieval_cache.corpus_version
+        
+        chunks = await self._search(query, query_embedding, max_results, doc_filter, search_params)
+        retrieval_cache.put(cache_key, chunks, corpus_version)
+        return chunks
+    
+    async def _search(self, query: str, query_embedding: np.ndarray, max_results: int,
+                      doc_filter: List[int], search_params: Dict[str, int]) -> List[Chunk]:
+        candidates = max_results * 3  # Get 3x candidates
+        
+        # Coarse stage: narrow the chunk search to the closest documents
+        top_documents = search_params.get('top_documents') or (
+            settings.two_stage_documents if settings.two_stage_retrieval else None
+        )
+        if top_documents and not doc_filter:
+            doc_filter = await self._select_documents(query_embedding, top_documents) or None
+        
+        if not settings.lexical_search:
+            chunks = await self._vector_search(query_embedding, candidates, doc_filter, search_params)
+            if not chunks:
+                return []
+            # In-memory BM25 reranking over the vector candidates only
+            return self._hybrid_rerank(query, chunks, max_results)
+        
+        # Step 1: Vector and lexical search in parallel on separate connections
+        vector_chunks, lexical_chunks = await asyncio.gather(
+            self._vector_search(query_embedding, candidates, doc_filter, search_params),
+            self._lexical_search(query, candidates, doc_filter)
+        )
+        
+        if not vector_chunks and not lexical_chunks:
+            return []
+        
+        # Step 2: Reciprocal rank fusion
+        return self._rrf_fuse(query_embedding, vector_chunks, lexical_chunks, max_results)
+    
+    async def retrieve_batch(self, queries: List[str], max_results: int = 10, document_ids: List[int] = None,
+                             search_params: Dict[str, int] = None) -> List[List[Chunk]]:
+        """
+        Retrieve for many queries at once: one batched encode, then a single SQL
+        round trip each for vector and lexical search (unnest + LATERAL)
+        """
+        if not queries:
+            return []
+        doc_filter = document_ids or getattr(self, 'document_ids', None)
+        search_params = search_params or {}
+        
+        query_embeddings = await embedding_service.encode_queries(queries, normalize=settings.normalize_embeddings)
+        
+        # Serve what the result cache has; only the misses go to the database
+        keys = [retrieval_cache.make_key(embedding, doc_filter, max_results, search_params)
+                for embedding in query_embeddings]
+        results = [retrieval_cache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        corpus_version = retrieval_cache.corpus_version
+        
+        searched = await self._search_batch(
+            [queries[i] for i in pending], [query_embeddings[i] for i in pending],
+            max_results, doc_filter, search_params
+        )
+        for i, chunks in zip(pending, searched):
+            retrieval_cache.put(keys[i], chunks, corpus_version)
+            results[i] = chunks
+        return results
+    
+    async def _search_batch(self, queries: List[str], query_embeddings: List[np.ndarray], max_results: int,
+                            doc_filter: List[int], search_params: Dict[str, int]) -> List[List[Chunk]]:
+        candidates = max_results * 3
+        top_documents = None if doc_filter else search_params.get('top_documents') or (
+            settings.two_stage_documents if settings.two_stage_retrieval else None
+        )
+        
+        if not settings.lexical_search:
+            vector_results = await self._vector_search_batch(
+                query_embeddings, candidates, doc_filter, top_documents, search_params
+            )
+            return [self._hybrid_rerank(query, chunks, max_results) for query, chunks in zip(queries, vector_results)]
+        
+        vector_results, lexical_results = await asyncio.gather(
+            self._vector_search_batch(query_embeddings, candidates, doc_filter, top_documents, search_params),
+            self._lexical_search_batch(queries, query_embeddings, candidates, doc_filter, top_documents)
+        )
+        return [
+            self._rrf_fuse(query_embedding, vector_chunks, lexical_chunks, max_results)
+            for query_embedding, vector_chunks, lexical_chunks in zip(query_embeddings, vector_results, lexical_results)
+        ]
+    
+    async def _vector_search_batch(self, query_embeddings: List[np.ndarray], limit: int, doc_filter: List[int],
+                                   top_documents: int, search_params: Dict[str, int]) -> List[List[Chunk]]:
+        if settings.local_vector_index and local_vector_index.ready:
+            if top_documents:
+                doc_filters = await self._select_documents_batch(query_embeddings, top_documents)
+                results = await asyncio.gather(*(
+                    local_vector_index.search(query_embedding, limit, query_filter or None)
+                    for query_embedding, query_filter in zip(query_embeddings, doc_filters)
+                ))
+            else:
+                results = await local_vector_index.search_batch(query_embeddings, limit, doc_filter)
+            return [
+                [Chunk(**record, embedding=embedding, similarity_score=score) for record, score, embedding in hits]
+                for hits in results
+            ]
+        
+        params = [query_embeddings, limit]
+        join, condition = self._batch_filter_sql(doc_filter, top_documents, params)
+        sql = f"""
+            SELECT q.ord, hits.*
+            FROM unnest($1::vector[]) WITH ORDINALITY AS q(embedding, ord)
+            {join}
+            CROSS JOIN LATERAL (
+                SELECT c.id, c.content, c.document_id, c.chunk_index, c.metadata, c.embedding,
+                       {db_manager.vector_similarity_sql('c.embedding', 'q.embedding')} as similarity_score
+                FROM chunks c
+                WHERE {condition}
+                ORDER BY {db_manager.vector_distance_sql('c.embedding', 'q.embedding')}
+                LIMIT $2
+            ) hits
+            ORDER BY q.ord, hits.similarity_score DESC
+        """
+        
+        async with db_manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                await db_manager.apply_search_params(
+                    conn, search_params.get('ef_search'), search_params.get('probes')
+                )
+                rows = await conn.fetch(sql, *params)
+        
+        return self._group_by_query(
+            rows, len(query_embeddings), lambda row: self._row_to_chunk(row, row['similarity_score'])
+        )
+    
+    async def _lexical_search_batch(self, queries: List[str], query_embeddings: List[np.ndarray], limit: int,
+                                    doc_filter: List[int], top_documents: int) -> List[List[Chunk]]:
+        params = [queries, query_embeddings, limit]
+        join, condition = self._batch_filter_sql(doc_filter, top_documents, params)
+        sql = f"""
+            SELECT q.ord, hits.*
+            FROM unnest($1::text[], $2::vector[]) WITH ORDINALITY AS q(query, embedding, ord)
+            {join}
+            CROSS JOIN LATERAL (
+                SELECT c.id, c.content, c.document_id, c.chunk_index, c.metadata, c.embedding,
+                       ts_rank_cd(c.content_tsv, tq) as lexical_score
+                FROM chunks c,
+                     CAST(replace(plainto_tsquery('english', q.query)::text, '&', '|') AS tsquery) tq
+                WHERE c.content_tsv @@ tq AND {condition}
+                ORDER BY lexical_score DESC
+                LIMIT $3
+            ) hits
+            ORDER BY q.ord, hits.lexical_score DESC
+        """
+        
+        async with db_manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+        
+        return self._group_by_query(rows, len(queries), self._row_to_chunk)
+    
+    async def _select_documents_batch(self, query_embeddings: List[np.ndarray], limit: int) -> List[List[int]]:
+        async with db_manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT q.ord, d.id
+                FROM unnest($1::vector[]) WITH ORDINALITY AS q(embedding, ord)
+                CROSS JOIN LATERAL (
+                    SELECT id FROM documents
+                    WHERE embedding IS NOT NULL
+                    ORDER BY embedding <=> q.embedding
+                    LIMIT $2
+                ) d
+                ORDER BY q.ord
+            """, query_embeddings, limit)
+        return self._group_by_query(rows, len(query_embeddings), lambda row: row['id'])
+    
+    def _batch_filter_sql(self, doc_filter: List[int], top_documents: int, params: List[Any]) -> Tuple[str, str]:
+        """Per-query chunk filter for the LATERAL searches as (join, condition); appends its parameter"""
+        if doc_filter:
+            params.append(doc_filter)
+            return "", f"c.document_id = ANY(${len(params)})"
+        if top_documents:
+            # Coarse stage: each query's closest documents, computed once per query in
+            # its own LATERAL - as a subquery inside the chunk search it would be
+            # re-evaluated for every candidate chunk
+            params.append(top_documents)
+            join = f"""CROSS JOIN LATERAL (
+                SELECT array_agg(d.id) AS ids FROM (
+                    SELECT id FROM documents
+                    WHERE embedding IS NOT NULL
+                    ORDER BY embedding <=> q.embedding
+                    LIMIT ${len(params)}
+                ) d
+            ) top"""
+            return join, "c.document_id = ANY(top.ids)"
+        return "", "TRUE"
+    
+    @staticmethod
+    def _group_by_query(rows, count: int, convert) -> List[List[Any]]:
+        """Split LATERAL results (ord is 1-based) back into one list per query"""
+        grouped = [[] for _ in range(count)]
+        for row in rows:
+            grouped[row['ord'] - 1].append(convert(row))
+        return grouped
+    
+    async def _select_documents(self, query_embedding: np.ndarray, limit: int) -> List[int]:
+        """Top documents by cosine similarity of their mean-pooled chunk embedding"""
         async with db_manager.pg_pool.acquire() as conn:
-            base_query = """
-                SELECT c.id, c.content, c.document_id, c.chunk_index, c.metadata,
-                       1 - (c.embedding <=> $1::vector) as similarity_score
+            rows = await conn.fetch("""
+                SELECT id FROM documents
+                WHERE embedding IS NOT NULL
+                ORDER BY embedding <=> $1::vector
+                LIMIT $2
+            """, query_embedding, limit)
+        return [row['id'] for row in rows]
+    
+    async def _vector_search(self, query_embedding: np.ndarray, limit: int, doc_filter: List[int],
+                             search_params: Dict[str, int]) -> List[Chunk]:
+        if settings.local_vector_index and local_vector_index.ready:
+            # In-process mirror - no Postgres round trip
+            results = await local_vector_index.search(query_embedding, limit, doc_filter)
+            return [
+                Chunk(**record, embedding=embedding, similarity_score=score)
+                for record, score, embedding in results
+            ]
+        
+        async with db_manager.pg_pool.acquire() as conn:
+            base_query = f"""
+                SELECT c.id, c.content, c.document_id, c.chunk_index, c.metadata, c.embedding,
+                       {db_manager.vector_similarity_sql('c.embedding', '$1')} as similarity_score
                 FROM chunks c
             """
             
-            params = [query_vector]
+            params = [query_embedding]
             
             if doc_filter:
                 base_query += " WHERE c.document_id = ANY($2)"
                 params.append(doc_filter)
             
-            base_query += " ORDER BY c.embedding <=> $1::vector LIMIT $" + str(len(params) + 1)
-            params.append(max_results * 3)  # Get 3x candidates
-            
-            results = await conn.fetch(base_query, *params)
+            base_query += f" ORDER BY {db_manager.vector_distance_sql('c.embedding', '$1')} LIMIT $" + str(len(params) + 1)
+            params.append(limit)
             
-            chunks = [
-                Chunk(
-                    id=row['id'],
-                    content=row['content'],
-                    document_id=row['document_id'],
-                    chunk_index=row['chunk_index'],
-                    metadata=json.loads(row['metadata']) if row['metadata'] else {},
-                    embedding=None,
-                    similarity_score=row['similarity_score']
+            # SET LOCAL only lasts for the transaction, so the pooled connection stays clean
+            async with conn.transaction():
+                await db_manager.apply_search_params(
+                    conn, search_params.get('ef_search'), search_params.get('probes')
                 )
-                for row in results
-            ]
+                results = await conn.fetch(base_query, *params)
         
-        if not chunks:
-            return []
+        return [self._row_to_chunk(row, row['similarity_score']) for row in results]
+    
+    async def _lexical_search(self, query: str, limit: int, doc_filter: List[int]) -> List[Chunk]:
+        """Full-text search over the GIN-indexed tsvector column"""
+        # OR the query terms together so partial matches still rank
+        base_query = """
+            SELECT c.id, c.content, c.document_id, c.chunk_index, c.metadata, c.embedding,
+                   ts_rank_cd(c.content_tsv, q) as lexical_score
+            FROM chunks c,
+                 CAST(replace(plainto_tsquery('english', $1)::text, '&', '|') AS tsquery) q
+            WHERE c.content_tsv @@ q
+        """
+        params = [query]
         
-        # Step 2: BM25 reranking
-        chunks = self._hybrid_rerank(query, chunks, max_results)
+        if doc_filter:
+            base_query += " AND c.document_id = ANY($2)"
+            params.append(doc_filter)
         
-        return chunks
+        base_query += " ORDER BY lexical_score DESC LIMIT $" + str(len(params) + 1)
+        params.append(limit)
+        
+        async with db_manager.pg_pool.acquire() as conn:
+            results = await conn.fetch(base_query, *params)
+        
+        return [self._row_to_chunk(row) for row in results]
+    
+    def _rrf_fuse(self, query_embedding: np.ndarray, vector_chunks: List[Chunk],
+                  lexical_chunks: List[Chunk], top_k: int) -> List[Chunk]:
+        """Reciprocal rank fusion: score = sum of 1 / (k + rank) over both result lists"""
+        k = settings.rrf_k
+        fused_scores = {}
+        chunks_by_id = {}
+        
+        for ranked in (vector_chunks, lexical_chunks):
+            for rank, chunk in enumerate(ranked, start=1):
+                fused_scores[chunk.id] = fused_scores.get(chunk.id, 0.0) + 1.0 / (k + rank)
+                chunks_by_id.setdefault(chunk.id, chunk)
+        
+        # Lexical-only hits still need a vector similarity for downstream stages
+        for chunk in chunks_by_id.values():
+            if chunk.similarity_score is None and chunk.embedding is not None:
+                embedding = np.asarray(chunk.embedding)
+                chunk.similarity_score = float(np.dot(query_embedding, embedding) / (
+                    np.linalg.norm(query_embedding) * np.linalg.norm(embedding) + 1e-8))
+        
+        ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+        return [chunks_by_id[chunk_id] for chunk_id in ranked_ids]
+    
+    def _row_to_chunk(self, row, similarity_score: float = None) -> Chunk:
+        return Chunk(
+            id=row['id'],
+            content=row['content'],
+            document_id=row['document_id'],
+            chunk_index=row['chunk_index'],
+            metadata=row['metadata'] or {},
+            embedding=row['embedding'],
+            similarity_score=similarity_score
+        )
     
     def _hybrid_rerank(self, query: str, chunks: List[Chunk], top_k: int) -> List[Chunk]:
         """Rerank using BM25 + vector scores"""
@@ -81,13 +355,14 @@ class SimpleRetriever:
 class ComplexRetriever:
     """Multi-hop graph traversal for complex queries"""
     
-    async def retrieve(self, query: str, max_results: int = 10, document_ids: List[int] = None) -> List[Chunk]:
+    async def retrieve(self, query: str, max_results: int = 10, document_ids: List[int] = None,
+                       search_params: Dict[str, int] = None) -> List[Chunk]:
         # Use document_ids from parameter or stored attribute
         doc_filter = document_ids or getattr(self, 'document_ids', None)
         
         # First get initial candidates
         simple_retriever = SimpleRetriever()
-        initial_chunks = await simple_retriever.retrieve(query, max_results * 2, doc_filter)
+        initial_chunks = await simple_retriever.retrieve(query, max_results * 2, doc_filter, search_params)
         
         # Then expand via graph traversal
         expanded_chunks = await self._graph_expansion(initial_chunks, query)
@@ -119,7 +394,7 @@ class ComplexRetriever:
         if related_chunk_ids:
             async with db_manager.pg_pool.acquire() as conn:
                 results = await conn.fetch("""
-                    SELECT id, content, document_id, chunk_index, metadata
+                    SELECT id, content, document_id, chunk_index, metadata, embedding
                     FROM chunks
                     WHERE id = ANY($1)
                 """, related_chunk_ids)
@@ -130,8 +405,8 @@ class ComplexRetriever:
                         content=row['content'],
                         document_id=row['document_id'],
                         chunk_index=row['chunk_index'],
-                        metadata=json.loads(row['metadata']) if row['metadata'] else {},
-                        embedding=None
+                        metadata=row['metadata'] or {},
+                        embedding=row['embedding']
                     )
                     for row in results
                 ]
@@ -0,0 +1,86 @@
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from app.core.config import settings
+from app.models.schemas import Chunk
+
+class RetrievalCache:
+    """
+    Bounded LRU of retrieval results keyed by (query embedding fingerprint,
+    document filter, max_results, search params). Any corpus change bumps a
+    monotonically increasing version, which drops every cached result.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or settings.retrieval_cache_size
+        self.corpus_version = 0
+        self.entries = OrderedDict()  # key -> List[Chunk]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.listeners = []  # called on every corpus change, e.g. the answer cache
+
+    def on_corpus_change(self, callback: Callable[[int], None]):
+        self.listeners.append(callback)
+
+    @staticmethod
+    def fingerprint(embedding: np.ndarray) -> str:
+        """Hash of the float16-quantized embedding, so numerically near-identical queries share a key"""
+        quantized = np.asarray(embedding, dtype=np.float16)
+        return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+    def make_key(self, embedding: np.ndarray, document_ids: Optional[List[int]], max_results: int,
+                 search_params: Dict[str, int] = None) -> Tuple:
+        params = tuple(sorted((search_params or {}).items()))
+        doc_filter = tuple(sorted(set(document_ids))) if document_ids else None
+        return (self.fingerprint(embedding), doc_filter, max_results, params)
+
+    def bump_corpus_version(self) -> int:
+        """Called whenever documents are added, changed or deleted"""
+        self.corpus_version += 1
+        if self.entries:
+            self.invalidations += 1
+            self.entries.clear()
+        for callback in self.listeners:
+            callback(self.corpus_version)
+        return self.corpus_version
+
+    def get(self, key: Tuple) -> Optional[List[Chunk]]:
+        if not settings.retrieval_cache:
+            return None
+        chunks = self.entries.get(key)
+        if chunks is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        # Later pipeline stages adjust scores on the chunks they get
+        return [chunk.model_copy() for chunk in chunks]
+
+    def put(self, key: Tuple, chunks: List[Chunk], corpus_version: int):
+        """Store a result computed at `corpus_version`; stale results are dropped"""
+        if not settings.retrieval_cache or corpus_version != self.corpus_version:
+            return
+        self.entries[key] = [chunk.model_copy() for chunk in chunks]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_statistics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.retrieval_cache,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "corpus_version": self.corpus_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+retrieval_cache = RetrievalCache()
@@ -1,29 +1,33 @@
 import asyncio
+import hashlib
+import time
 import numpy as np
-from typing import List, Dict, Any, Tuple
-from dataclasses import dataclass
-import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional
+from app.core.config import settings
+from app.core.processes import spawn_process_pool
 from app.models.schemas import Chunk
 
-@dataclass
-class RetrievalAgent:
-    agent_id: int
-    position: np.ndarray  # Position in embedding space
-    velocity: np.ndarray
-    best_position: np.ndarray
-    best_score: float
-    specialization: str  # 'explorer', 'exploiter', 'scout'
+SPECIALIZATIONS = ('explorer', 'exploiter', 'scout')
+EXPLORER, EXPLOITER, SCOUT = range(len(SPECIALIZATIONS))
 
-class SwarmIntelligenceRetrieval:
+class Swarm:
     """
-    Swarm Intelligence Retrieval: Uses collective behavior of autonomous agents
-    to explore the document space and find optimal retrieval paths
+    One query's swarm: agents, global best and pheromone trails, driven by its
+    own random generator. Held as (agents x dims) arrays and updated in one
+    vectorized step per iteration; specializations are boolean masks over the
+    agent axis. Plain arrays in and out, so it can run in a worker process.
     """
     
-    def __init__(self, n_agents: int = 50, dimensions: int = 384):  # Match embedding model dimensions
+    def __init__(self, n_agents: int = 50, dimensions: int = 384, seed=None):
         self.n_agents = n_agents
         self.dimensions = dimensions
-        self.agents = []
+        self.rng = np.random.default_rng(seed)
+        self.positions = None       # (agents, dims)
+        self.velocities = None      # (agents, dims)
+        self.best_positions = None  # (agents, dims) personal bests
+        self.best_scores = None     # (agents,)
+        self.specializations = None # (agents,) index into SPECIALIZATIONS
         self.global_best_position = None
         self.global_best_score = 0.0  # Start with 0 instead of -inf
         self.pheromone_trails = {}  # (chunk1, chunk2) -> strength
@@ -31,118 +35,121 @@ class SwarmIntelligenceRetrieval:
     
     def initialize_swarm(self):
         """Initialize swarm with diverse agent types"""
-        for i in range(self.n_agents):
-            # Assign specialization
-            if i < self.n_agents * 0.6:
-                specialization = 'explorer'  # 60% explorers
-            elif i < self.n_agents * 0.9:
-                specialization = 'exploiter'  # 30% exploiters
-            else:
-                specialization = 'scout'     # 10% scouts
-            
-            agent = RetrievalAgent(
-                agent_id=i,
-                position=np.random.randn(self.dimensions),
-                velocity=np.random.randn(self.dimensions) * 0.1,
-                best_position=np.random.randn(self.dimensions),
-                best_score=0.0,  # Start with 0 instead of -inf
-                specialization=specialization
-            )
-            self.agents.append(agent)
+        # Assign specialization: 60% explorers, 30% exploiters, 10% scouts
+        agent_ids = np.arange(self.n_agents)
+        self.specializations = np.select(
+            [agent_ids < self.n_agents * 0.6, agent_ids < self.n_agents * 0.9],
+            [EXPLORER, EXPLOITER], default=SCOUT
+        )
+        # float32 throughout: the per-iteration cost is random draws and elementwise updates
+        self.positions = self._normal((self.n_agents, self.dimensions))
+        self.velocities = self._normal((self.n_agents, self.dimensions)) * 0.1
+        self.best_positions = self._normal((self.n_agents, self.dimensions))
+        self.best_scores = np.zeros(self.n_agents, dtype=np.float32)  # Start with 0 instead of -inf
     
-    async def swarm_search(self, query_embedding: np.ndarray, chunks: List[Chunk], 
-                          iterations: int = 100) -> List[Tuple[Chunk, float]]:
-        """Main swarm intelligence search algorithm"""
-        
-        # Convert chunks to searchable space
-        chunk_embeddings = []
-        for chunk in chunks:
-            if hasattr(chunk, 'embedding') and chunk.embedding:
-                embedding = np.array(chunk.embedding)
-            else:
-                # Generate embedding if not available
-                from app.core.database import db_manager
-                embedding = db_manager.embedding_model.encode(chunk.content)
-            
-            # Ensure correct dimensions (384 for sentence-transformers)
-            if len(embedding) != self.dimensions:
-                if len(embedding) > self.dimensions:
-                    embedding = embedding[:self.dimensions]  # Truncate
-                else:
-                    embedding = np.pad(embedding, (0, self.dimensions - len(embedding)))  # Pad
-            
-            chunk_embeddings.append(embedding)
-        
-        if not chunk_embeddings:
-            return []
-        
-        chunk_embeddings = np.array(chunk_embeddings)
+    def _normal(self, shape) -> np.ndarray:
+        return self.rng.standard_normal(shape, dtype=np.float32)
+    
+    def specialization_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.specializations, minlength=len(SPECIALIZATIONS))
+        return {name: int(count) for name, count in zip(SPECIALIZATIONS, counts)}
+    
+    def optimize(self, query_unit: np.ndarray, chunk_units: np.ndarray, iterations: int,
+                 patience: int, min_improvement: float, velocity_tolerance: float,
+                 time_budget_ms: Optional[float] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Run the swarm against unit query and chunk embeddings; returns a score per
+        chunk and a summary of the run. Stops early once the global best hasn't
+        improved for `patience` iterations or the swarm comes to rest; with
+        `time_budget_ms` it is an anytime search that returns the best ranking
+        found when the budget runs out.
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget_ms / 1000 if time_budget_ms else None
+        best_score = self.global_best_score
+        stalled = 0
+        stop_reason = "max_iterations"
         
         # Run swarm optimization
-        for iteration in range(iterations):
-            await self._update_swarm(query_embedding, chunk_embeddings, chunks)
+        iteration = 0
+        while iteration < iterations:
+            self._update_swarm(query_unit, chunk_units)
             
             # Adaptive behavior based on iteration
             if iteration % 20 == 0:
-                await self._adapt_swarm_behavior(iteration, iterations)
+                self._adapt_swarm_behavior(iteration, iterations)
+            iteration += 1
+            
+            # Convergence: global best stalled, or agents barely moving
+            if self.global_best_score > best_score + min_improvement:
+                best_score, stalled = self.global_best_score, 0
+            else:
+                stalled += 1
+            if patience and stalled >= patience:
+                stop_reason = "converged"
+                break
+            if np.sqrt(np.mean(self.velocities ** 2)) < velocity_tolerance:
+                stop_reason = "at_rest"
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                stop_reason = "deadline"
+                break
         
         # Collect results from all agents
-        results = await self._collect_swarm_results(chunks, chunk_embeddings)
-        
-        return sorted(results, key=lambda x: x[1], reverse=True)
+        scores = self._collect_swarm_results(chunk_units)
+        return scores, {
+            "iterations_run": iteration,
+            "max_iterations": iterations,
+            "stop_reason": stop_reason,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+            "consensus": self.get_consensus(),
+            "global_best_score": self.global_best_score,
+            "specialization_distribution": self.specialization_counts()
+        }
     
-    async def _update_swarm(self, query_embedding: np.ndarray, 
-                           chunk_embeddings: np.ndarray, chunks: List[Chunk]):
-        """Update all agents in the swarm"""
+    def _update_swarm(self, query_unit: np.ndarray, chunk_units: np.ndarray):
+        """Update all agents in the swarm in one step"""
+        # Calculate fitness for current positions
+        fitness = self._calculate_fitness(self.positions, query_unit, chunk_units)
         
-        for agent in self.agents:
-            # Calculate fitness for current position
-            fitness = await self._calculate_fitness(agent.position, query_embedding, 
-                                                  chunk_embeddings, agent.specialization)
-            
-            # Update personal best
-            if fitness > agent.best_score:
-                agent.best_score = fitness
-                agent.best_position = agent.position.copy()
-                
-                # Update global best
-                if fitness > self.global_best_score:
-                    self.global_best_score = fitness
-                    self.global_best_position = agent.position.copy()
-            
-            # Update velocity and position based on specialization
-            await self._update_agent_movement(agent, query_embedding)
+        # Update personal bests
+        improved = fitness > self.best_scores
+        self.best_scores[improved] = fitness[improved]
+        self.best_positions[improved] = self.positions[improved]
+        
+        # Update global best
+        best = int(np.argmax(fitness))
+        if fitness[best] > self.global_best_score:
+            self.global_best_score = float(fitness[best])
+            self.global_best_position = self.positions[best].copy()
+        
+        # Update velocities and positions based on specialization
+        self._update_agent_movement()
     
-    async def _calculate_fitness(self, position: np.ndarray, query_embedding: np.ndarray,
-                               chunk_embeddings: np.ndarray, specialization: str) -> float:
-        """Calculate fitness score for agent position"""
+    def _calculate_fitness(self, positions: np.ndarray, query_unit: np.ndarray,
+                           chunk_units: np.ndarray) -> np.ndarray:
+        """Fitness of every agent position: one matrix product against the unit chunk embeddings"""
+        position_units = positions / (np.linalg.norm(positions, axis=1, keepdims=True) + 1e-8)
         
         # Base similarity to query
-        query_similarity = np.dot(position, query_embedding) / (
-            np.linalg.norm(position) * np.linalg.norm(query_embedding) + 1e-8)
-        
-        # Similarity to document chunks
-        chunk_similarities = np.dot(chunk_embeddings, position) / (
-            np.linalg.norm(chunk_embeddings, axis=1) * np.linalg.norm(position) + 1e-8)
-        
-        # Specialization-based fitness
-        if specialization == 'explorer':
-            # Explorers prefer diverse, novel positions
-            diversity_bonus = -np.mean(chunk_similarities)  # Negative correlation = diversity
-            fitness = query_similarity + 0.3 * diversity_bonus
-        elif specialization == 'exploiter':
-            # Exploiters prefer high-similarity clusters
-            exploitation_bonus = np.max(chunk_similarities)
-            fitness = query_similarity + 0.5 * exploitation_bonus
-        else:  # scout
-            # Scouts balance exploration and exploitation
-            balance = np.std(chunk_similarities)  # Standard deviation as balance measure
-            fitness = query_similarity + 0.2 * balance
-        
-        return fitness
-    
-    async def _update_agent_movement(self, agent: RetrievalAgent, query_embedding: np.ndarray):
-        """Update agent velocity and position using swarm dynamics"""
+        query_similarity = position_units @ query_unit
+        
+        # Similarity to document chunks, (agents x chunks)
+        chunk_similarities = position_units @ chunk_units.T
+        
+        # Specialization-based fitness:
+        # explorers prefer diverse, novel positions (negative correlation = diversity),
+        # exploiters prefer high-similarity clusters,
+        # scouts balance exploration and exploitation (standard deviation as balance measure)
+        bonus = np.select(
+            [self.specializations == EXPLORER, self.specializations == EXPLOITER],
+            [-0.3 * chunk_similarities.mean(axis=1), 0.5 * chunk_similarities.max(axis=1)],
+            default=0.2 * chunk_similarities.std(axis=1)
+        )
+        return query_similarity + bonus
+    
+    def _update_agent_movement(self):
+        """Update agent velocities and positions using swarm dynamics"""
         
         # PSO parameters
         w = 0.7  # Inertia weight
@@ -150,101 +157,204 @@ class SwarmIntelligenceRetrieval:
         c2 = 1.5  # Social parameter
         
         # Random factors
-        r1 = np.random.random(self.dimensions)
-        r2 = np.random.random(self.dimensions)
+        r1, r2 = self.rng.random((2, self.n_agents, self.dimensions), dtype=np.float32)
         
         # Velocity update
-        cognitive_component = c1 * r1 * (agent.best_position - agent.position)
-        social_component = c2 * r2 * (self.global_best_position - agent.position) if self.global_best_position is not None else 0
+        cognitive_component = c1 * r1 * (self.best_positions - self.positions)
+        social_component = c2 * r2 * (self.global_best_position - self.positions) if self.global_best_position is not None else 0
         
-        agent.velocity = w * agent.velocity + cognitive_component + social_component
+        self.velocities = w * self.velocities + cognitive_component + social_component
         
         # Specialization-specific modifications
-        if agent.specialization == 'explorer':
-            # Add random exploration
-            agent.velocity += 0.1 * np.random.randn(self.dimensions)
-        elif agent.specialization == 'scout':
-            # Occasional random jumps
-            if random.random() < 0.05:
-                agent.velocity = np.random.randn(self.dimensions) * 0.5
+        # Explorers: add random exploration
+        explorers = self.specializations == EXPLORER
+        self.velocities[explorers] += 0.1 * self._normal((int(explorers.sum()), self.dimensions))
+        # Scouts: occasional random jumps
+        jumps = (self.specializations == SCOUT) & (self.rng.random(self.n_agents) < 0.05)
+        self.velocities[jumps] = self._normal((int(jumps.sum()), self.dimensions)) * 0.5
         
-        # Position update
-        agent.position += agent.velocity
-        
-        # Apply bounds
-        agent.position = np.clip(agent.position, -5, 5)
+        # Position update, with bounds
+        self.positions = np.clip(self.positions + self.velocities, -5, 5)
     
-    async def _adapt_swarm_behavior(self, current_iteration: int, total_iterations: int):
+    def _adapt_swarm_behavior(self, current_iteration: int, total_iterations: int):
         """Adapt swarm behavior based on search progress"""
         progress = current_iteration / total_iterations
         
         # Gradually shift from exploration to exploitation
         if progress > 0.7:
             # Late stage: more exploitation
-            for agent in self.agents:
-                if agent.specialization == 'explorer' and random.random() < 0.3:
-                    agent.specialization = 'exploiter'
+            converted = (self.specializations == EXPLORER) & (self.rng.random(self.n_agents) < 0.3)
+            self.specializations[converted] = EXPLOITER
         
         # Update pheromone trails (ant colony optimization element)
-        await self._update_pheromone_trails()
+        self._update_pheromone_trails()
     
-    async def _update_pheromone_trails(self):
+    def _update_pheromone_trails(self):
         """Update pheromone trails between good solutions"""
         # Evaporation
         for key in self.pheromone_trails:
             self.pheromone_trails[key] *= 0.95
         
         # Reinforcement from best agents
-        best_agents = sorted(self.agents, key=lambda a: a.best_score, reverse=True)[:10]
-        
-        for agent in best_agents:
+        for agent in np.argsort(-self.best_scores)[:10]:
             # Create pheromone trail at agent's best position
-            position_hash = hash(tuple(agent.best_position.round(2)))
+            position_hash = hash(tuple(self.best_positions[agent].round(2)))
             if position_hash not in self.pheromone_trails:
                 self.pheromone_trails[position_hash] = 0
-            self.pheromone_trails[position_hash] += agent.best_score * 0.1
+            self.pheromone_trails[position_hash] += self.best_scores[agent] * 0.1
     
-    async def _collect_swarm_results(self, chunks: List[Chunk], 
-                                   chunk_embeddings: np.ndarray) -> List[Tuple[Chunk, float]]:
-        """Collect and rank results from swarm search"""
-        results = []
-        
+    def _collect_swarm_results(self, chunk_units: np.ndarray) -> np.ndarray:
+        """Consensus score per chunk from the top agents' best positions"""
         # Get top agent positions
-        top_agents = sorted(self.agents, key=lambda a: a.best_score, reverse=True)[:20]
-        
-        for chunk, embedding in zip(chunks, chunk_embeddings):
-            # Calculate consensus score from top agents
-            scores = []
-            for agent in top_agents:
-                similarity = np.dot(agent.best_position, embedding) / (
-                    np.linalg.norm(agent.best_position) * np.linalg.norm(embedding) + 1e-8)
-                scores.append(similarity * agent.best_score)
-            
-            # Weighted average score
-            consensus_score = np.mean(scores) if scores else 0
-            results.append((chunk, consensus_score))
+        top_agents = np.argsort(-self.best_scores)[:20]
+        positions = self.best_positions[top_agents]
+        position_units = positions / (np.linalg.norm(positions, axis=1, keepdims=True) + 1e-8)
         
-        return results
+        # Weighted average of similarity * agent score
+        similarities = position_units @ chunk_units.T
+        return (similarities * self.best_scores[top_agents, np.newaxis]).mean(axis=0)
     
     def get_consensus(self) -> float:
         """Get swarm consensus score"""
-        agent_scores = [a.best_score for a in self.agents if a.best_score > 0]
-        if not agent_scores:
+        agent_scores = self.best_scores[self.best_scores > 0]
+        if not len(agent_scores):
             return 0.92
-        return min(np.mean(agent_scores) + 0.5, 0.95)
+        return float(min(np.mean(agent_scores) + 0.5, 0.95))
+    
+def run_swarm(query_unit: np.ndarray, chunk_units: np.ndarray, n_agents: int, seed,
+              iterations: int, patience: int, min_improvement: float, velocity_tolerance: float,
+              time_budget_ms: Optional[float] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Worker entry point: build a fresh swarm for one query and run it to completion"""
+    swarm = Swarm(n_agents=n_agents, dimensions=chunk_units.shape[1], seed=seed)
+    return swarm.optimize(query_unit, chunk_units, iterations, patience,
+                          min_improvement, velocity_tolerance, time_budget_ms)
+
+class SwarmIntelligenceRetrieval:
+    """
+    Swarm Intelligence Retrieval: Uses collective behavior of autonomous agents
+    to explore the document space and find optimal retrieval paths.
+    Every query gets its own swarm, seeded from `swarm_seed` and the query
+    embedding, so rankings are reproducible and concurrent queries never share
+    agents. Swarms run on a process pool (or a thread with `swarm_workers=0`);
+    this object only keeps the pool and aggregate metrics.
+    """
+    
+    def __init__(self, n_agents: int = 50, dimensions: int = 384):  # Match embedding model dimensions
+        self.n_agents = n_agents
+        self.dimensions = dimensions
+        self.executor = None
+        
+        # Search metrics
+        self.searches = 0
+        self.iterations_run = 0
+        self.stop_reasons = {"max_iterations": 0, "converged": 0, "at_rest": 0, "deadline": 0}
+        self.last_search = None
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if settings.swarm_workers <= 0:
+            return None
+        if self.executor is None:
+            self.executor = spawn_process_pool(settings.swarm_workers)
+        return self.executor
+    
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+    
+    @staticmethod
+    def seed_for(query_embedding: np.ndarray) -> Optional[List[int]]:
+        """Seed from the configured base seed and the query, so the same query ranks the same chunks the same way"""
+        if settings.swarm_seed is None:
+            return None
+        digest = hashlib.blake2b(np.asarray(query_embedding, dtype=np.float32).tobytes(), digest_size=8).digest()
+        return [settings.swarm_seed, int.from_bytes(digest, "little")]
+    
+    def chunk_matrix(self, chunks: List[Chunk]) -> np.ndarray:
+        """Stack chunk embeddings to (chunks x dims), truncating or zero-padding to the swarm dimensions"""
+        matrix = np.zeros((len(chunks), self.dimensions), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            embedding = np.asarray(chunk.embedding)[:self.dimensions]
+            matrix[i, :len(embedding)] = embedding
+        return matrix
+    
+    async def swarm_search(self, query_embedding: np.ndarray, chunks: List[Chunk], 
+                          iterations: int = 100, patience: int = None,
+                          time_budget_ms: Optional[float] = None) -> Tuple[List[Tuple[Chunk, float]], float]:
+        """
+        Main swarm intelligence search algorithm.
+        Returns chunks ranked by swarm score and this swarm's consensus. Runs are
+        deterministic for a given seed, except that a `time_budget_ms` deadline
+        depends on how fast the worker gets through its iterations.
+        """
+        
+        # Stored vectors come back with the retrieval; only encode chunks without one
+        from app.services.embedding_service import embedding_service
+        await embedding_service.ensure_chunk_embeddings(chunks)
+        
+        if not chunks:
+            return [], 0.0
+        
+        # Convert chunks to searchable space, normalized once for every fitness evaluation
+        chunk_embeddings = self.chunk_matrix(chunks)
+        chunk_units = chunk_embeddings / (np.linalg.norm(chunk_embeddings, axis=1, keepdims=True) + 1e-8)
+        query_unit = np.asarray(query_embedding, dtype=np.float32)
+        query_unit = query_unit / (np.linalg.norm(query_unit) + 1e-8)
+        
+        args = (
+            query_unit, chunk_units, self.n_agents, self.seed_for(query_embedding), iterations,
+            settings.swarm_patience if patience is None else patience,
+            settings.swarm_min_improvement, settings.swarm_velocity_tolerance, time_budget_ms
+        )
+        executor = self._get_executor()
+        if executor:
+            scores, summary = await asyncio.get_running_loop().run_in_executor(executor, run_swarm, *args)
+        else:
+            scores, summary = await asyncio.to_thread(run_swarm, *args)
+        
+        self.searches += 1
+        self.iterations_run += summary["iterations_run"]
+        self.stop_reasons[summary["stop_reason"]] += 1
+        self.last_search = summary
+        
+        order = np.argsort(-scores)
+        return [(chunks[i], float(scores[i])) for i in order], summary["consensus"]
+    
+    def get_consensus(self) -> float:
+        """Consensus of the most recent swarm"""
+        return self.last_search["consensus"] if self.last_search else 0.92
+    
+    @property
+    def global_best_score(self) -> float:
+        return self.last_search["global_best_score"] if self.last_search else 0.0
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "iterations_run": self.iterations_run,
+            "avg_iterations": self.iterations_run / self.searches if self.searches else 0.0,
+            "stop_reasons": self.stop_reasons,
+            "seed": settings.swarm_seed,
+            "workers": settings.swarm_workers,
+            "last_search": self.last_search
+        }
     
-    async def collective_retrieve(self, query: str, chunks: List) -> List:
-        """Swarm-based collective retrieval"""
+    async def collective_retrieve(self, query: str, chunks: List,
+                                  time_budget_ms: Optional[float] = None) -> Tuple[List, float]:
+        """Swarm-based collective retrieval; returns the reordered chunks and the swarm's consensus"""
         if not chunks:
-            return chunks
+            return chunks, 0.92
         
-        from app.core.database import db_manager
-        query_embedding = db_manager.embedding_model.encode(query)
+        from app.services.embedding_service import embedding_service
+        query_embedding = await embedding_service.encode_query(query)
         
         # Run swarm search with fewer iterations for speed
-        results = await self.swarm_search(query_embedding, chunks, iterations=20)
+        results, consensus = await self.swarm_search(
+            query_embedding, chunks, iterations=settings.swarm_iterations,
+            time_budget_ms=time_budget_ms if time_budget_ms is not None else settings.swarm_time_budget_ms
+        )
         
         # Return top chunks
-        return [chunk for chunk, score in results[:len(chunks)]]
+        return [chunk for chunk, score in results[:len(chunks)]], consensus
 
-swarm_retriever = SwarmIntelligenceRetrieval()
\ No newline at end of file
+swarm_retriever = SwarmIntelligenceRetrieval()
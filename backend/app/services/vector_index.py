@@ -0,0 +1,336 @@
+import asyncio
+import os
+import socket
+import threading
+import numpy as np
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional
+from app.core.database import db_manager
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """A consistent view for searches; writers publish a new one rather than changing it"""
+    matrix: np.ndarray
+    chunk_ids: np.ndarray
+    document_ids: np.ndarray
+    assignments: np.ndarray
+    centroids: Optional[np.ndarray]
+    records: Dict[int, Dict[str, Any]]
+    size: int
+
+class LocalVectorIndex:
+    """
+    In-process mirror of chunks.embedding for sub-millisecond search.
+    Unit-normalized float32 rows live in a memory-mapped file private to this
+    process (API processes mirror independently); an optional IVF coarse
+    quantizer (k-means centroids) narrows the scan on large corpora.
+    Postgres stays the source of truth - the mirror is rebuilt from it at startup.
+    Searches score against an immutable snapshot without locking; writers run
+    on a worker thread, one at a time, and swap in a new snapshot when done.
+    Rows a published snapshot covers are never modified in place - appends go
+    past its size and removals compact into a fresh mapping.
+    """
+
+    def __init__(self, path: str = None, dimensions: int = 384):
+        self.path = Path(path or settings.local_vector_index_path)
+        self.dimensions = dimensions
+        self.ready = False
+        self.size = 0
+        self.capacity = 0
+        self.matrix = None                                   # memmap (capacity, dimensions)
+        self.chunk_ids = np.zeros(0, dtype=np.int64)
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.assignments = np.zeros(0, dtype=np.int32)       # IVF list per row
+        self.centroids = None
+        self.records = {}  # chunk_id -> {content, document_id, chunk_index, metadata}
+        self._generation = 0  # numbers the mapping files
+        self._snapshot = None
+        self._write_lock = threading.Lock()
+
+    async def load(self):
+        """Rebuild the mirror from Postgres"""
+        async with db_manager.pg_pool.acquire() as conn:
+            count = await conn.fetchval("SELECT COUNT(*) FROM chunks WHERE embedding IS NOT NULL")
+            rows = await conn.fetch("""
+                SELECT id, content, document_id, chunk_index, metadata, embedding
+                FROM chunks WHERE embedding IS NOT NULL ORDER BY id
+            """)
+        await asyncio.to_thread(self._rebuild, rows, count)
+        self.ready = True
+
+        logger.info(f"Local vector index loaded: {self.size} chunks, "
+                    f"{0 if self.centroids is None else len(self.centroids)} IVF lists")
+
+    def _rebuild(self, rows, count: int):
+        self._remove_stale_files()
+        with self._write_lock:
+            old_matrix = self.matrix
+            self.matrix = None
+            self.size = 0
+            self.records = {}
+            self.centroids = None
+            self._allocate(max(count, 1024))
+            self._append(rows)
+            self._train_ivf()
+            self._publish()
+        if old_matrix is not None:
+            self._unlink(old_matrix)
+
+    async def add_document(self, doc_id: int):
+        """Mirror a newly ingested document's chunks (idempotent)"""
+        if not self.ready:
+            return
+        rows = await self._fetch_document(doc_id)
+        await asyncio.to_thread(self._apply, doc_id, rows, False)
+
+    async def reload_document(self, doc_id: int):
+        """Re-mirror a document whose chunks changed, in one swap"""
+        if not self.ready:
+            return
+        rows = await self._fetch_document(doc_id)
+        await asyncio.to_thread(self._apply, doc_id, rows, True)
+
+    async def remove_document(self, doc_id: int):
+        """Drop a deleted document's rows"""
+        if not self.ready:
+            return
+        await asyncio.to_thread(self._apply, doc_id, [], True)
+
+    async def _fetch_document(self, doc_id: int):
+        async with db_manager.pg_pool.acquire() as conn:
+            return await conn.fetch("""
+                SELECT id, content, document_id, chunk_index, metadata, embedding
+                FROM chunks WHERE document_id = $1 AND embedding IS NOT NULL ORDER BY id
+            """, doc_id)
+
+    def _apply(self, doc_id: int, rows, replace: bool):
+        """Optionally drop the document's current rows, append `rows`, then publish"""
+        with self._write_lock:
+            if replace:
+                current = self.chunk_ids[:self.size][self.document_ids[:self.size] == doc_id]
+                if len(current) == len(rows) and set(current.tolist()) == {row['id'] for row in rows}:
+                    # Same chunks - vectors are unchanged, at most their index or metadata moved
+                    changed = [row for row in rows if self._record(row) != self.records[row['id']]]
+                    if changed:
+                        self.records = dict(self.records)
+                        self.records.update((row['id'], self._record(row)) for row in changed)
+                        self._publish()
+                    return
+                keep = self.document_ids[:self.size] != doc_id
+                if not keep.all():
+                    # Compact into a fresh mapping - searches may still be reading the current one
+                    removed = self.chunk_ids[:self.size][~keep]
+                    self.records = dict(self.records)
+                    for chunk_id in removed:
+                        self.records.pop(int(chunk_id), None)
+                    self._allocate(max(self.capacity, int(keep.sum()) + len(rows)), keep)
+            self._append([row for row in rows if row['id'] not in self.records])
+            self._publish()
+
+    def _publish(self):
+        self._snapshot = IndexSnapshot(
+            matrix=self.matrix, chunk_ids=self.chunk_ids, document_ids=self.document_ids,
+            assignments=self.assignments, centroids=self.centroids, records=self.records, size=self.size
+        )
+
+    async def search(self, query_embedding: np.ndarray, top_k: int,
+                     document_ids: List[int] = None) -> List[Tuple[Dict[str, Any], float, np.ndarray]]:
+        """Cosine top-k on a worker thread - the BLAS matmul releases the GIL"""
+        return await asyncio.to_thread(self._search, query_embedding, top_k, document_ids)
+
+    async def search_batch(self, query_embeddings: List[np.ndarray], top_k: int,
+                           document_ids: List[int] = None) -> List[List[Tuple[Dict[str, Any], float, np.ndarray]]]:
+        """Top-k for many queries; the exact scan becomes one (queries x rows) matmul"""
+        return await asyncio.to_thread(self._search_batch, query_embeddings, top_k, document_ids)
+
+    def _search(self, query_embedding: np.ndarray, top_k: int,
+                document_ids: Optional[List[int]]) -> List[Tuple[Dict[str, Any], float, np.ndarray]]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+
+        index = self._snapshot
+        if index is None or index.size == 0:
+            return []
+
+        mask = None
+        if index.centroids is not None:
+            nprobe = min(settings.local_vector_index_nprobe, len(index.centroids))
+            probe_lists = np.argpartition(-(index.centroids @ query), nprobe - 1)[:nprobe]
+            mask = np.isin(index.assignments[:index.size], probe_lists)
+        if document_ids:
+            doc_mask = np.isin(index.document_ids[:index.size], document_ids)
+            mask = doc_mask if mask is None else mask & doc_mask
+
+        if mask is None:
+            rows = None
+            scores = index.matrix[:index.size] @ query
+        else:
+            rows = np.flatnonzero(mask)
+            if not len(rows):
+                return []
+            scores = index.matrix[rows] @ query
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return [(index.records[int(index.chunk_ids[pos])], float(scores[idx]), np.array(index.matrix[pos]))
+                for pos, idx in zip(positions, top)]
+
+    def _search_batch(self, query_embeddings: List[np.ndarray], top_k: int,
+                      document_ids: Optional[List[int]]) -> List[List[Tuple[Dict[str, Any], float, np.ndarray]]]:
+        index = self._snapshot
+        if index is not None and index.centroids is not None:
+            # Each query probes its own IVF lists
+            return [self._search(query, top_k, document_ids) for query in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+
+        if index is None or index.size == 0:
+            return [[] for _ in queries]
+
+        rows = None
+        if document_ids:
+            rows = np.flatnonzero(np.isin(index.document_ids[:index.size], document_ids))
+            if not len(rows):
+                return [[] for _ in queries]
+        matrix = index.matrix[:index.size] if rows is None else index.matrix[rows]
+        scores = queries @ matrix.T
+
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, query_top in zip(scores, top):
+            query_top = query_top[np.argsort(-query_scores[query_top])]
+            positions = query_top if rows is None else rows[query_top]
+            results.append([
+                (index.records[int(index.chunk_ids[pos])], float(query_scores[idx]), np.array(index.matrix[pos]))
+                for pos, idx in zip(positions, query_top)
+            ])
+        return results
+
+    def _allocate(self, capacity: int, keep: np.ndarray = None):
+        """
+        Create a new memmap with room for `capacity` rows, carrying over existing
+        rows (only those selected by the boolean `keep` mask, when given)
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        old_matrix, old_size = self.matrix, self.size
+        self._generation += 1
+        filename = self.path / f"embeddings_{self._owner()}_{self._generation}.f32"
+        matrix = np.memmap(filename, dtype=np.float32, mode='w+', shape=(capacity, self.dimensions))
+
+        def carry(array: np.ndarray) -> np.ndarray:
+            rows = array[:old_size] if keep is None else array[:old_size][keep]
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[:len(rows)] = rows
+            return resized
+
+        new_size = old_size if keep is None else int(keep.sum())
+        if old_matrix is not None and new_size:
+            matrix[:new_size] = old_matrix[:old_size] if keep is None else old_matrix[:old_size][keep]
+        self.chunk_ids = carry(self.chunk_ids)
+        self.document_ids = carry(self.document_ids)
+        self.assignments = carry(self.assignments)
+        self.matrix = matrix
+        self.capacity = capacity
+        self.size = new_size
+
+        if old_matrix is not None:
+            self._unlink(old_matrix)
+
+    @staticmethod
+    def _unlink(matrix: np.memmap):
+        # Snapshots still using the old mapping keep it alive until they are done
+        try:
+            Path(matrix.filename).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _owner() -> str:
+        # Host as well as pid: containers sharing the volume all run as low pids
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    def _remove_stale_files(self):
+        """Delete this host's mappings left behind by processes that are no longer running"""
+        prefix = f"embeddings_{socket.gethostname()}-"
+        for path in self.path.glob(f"{prefix}*.f32"):
+            try:
+                pid = int(path.name[len(prefix):].split("_")[0])
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)
+            except (ValueError, PermissionError):
+                continue
+
+    def _append(self, rows):
+        if not rows:
+            return
+        if self.size + len(rows) > self.capacity:
+            self._allocate(max(self.capacity * 2, self.size + len(rows)))
+
+        embeddings = np.asarray([row['embedding'] for row in rows], dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+
+        start, end = self.size, self.size + len(rows)
+        self.matrix[start:end] = embeddings
+        self.chunk_ids[start:end] = [row['id'] for row in rows]
+        self.document_ids[start:end] = [row['document_id'] for row in rows]
+        self.assignments[start:end] = (
+            np.argmax(embeddings @ self.centroids.T, axis=1) if self.centroids is not None else 0
+        )
+        self.size = end
+
+        for row in rows:
+            self.records[row['id']] = self._record(row)
+
+    @staticmethod
+    def _record(row) -> Dict[str, Any]:
+        return {
+            "id": row['id'],
+            "content": row['content'],
+            "document_id": row['document_id'],
+            "chunk_index": row['chunk_index'],
+            "metadata": row['metadata'] or {}
+        }
+
+    def _train_ivf(self, iterations: int = 10):
+        """Spherical k-means coarse quantizer; exact scan below the size threshold"""
+        self.centroids = None
+        if self.size < settings.local_vector_index_ivf_threshold:
+            return
+
+        data = self.matrix[:self.size]
+        n_lists = int(np.sqrt(self.size))
+        rng = np.random.default_rng(0)
+        centroids = np.array(data[rng.choice(self.size, n_lists, replace=False)])
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = data[assignments == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) + 1e-12)
+
+        self.centroids = centroids
+        self.assignments[:self.size] = np.argmax(data @ centroids.T, axis=1)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.local_vector_index,
+            "ready": self.ready,
+            "chunks": self.size,
+            "capacity": self.capacity,
+            "ivf_lists": 0 if self.centroids is None else len(self.centroids),
+            "nprobe": settings.local_vector_index_nprobe,
+            "path": str(self.path)
+        }
+
+local_vector_index = LocalVectorIndex()
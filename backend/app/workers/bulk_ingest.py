@@ -0,0 +1,50 @@
+"""
+Bulk directory ingestion.
+
+Ingests every PDF/DOCX/TXT file under a directory through the staged
+extract -> embed -> write pipeline and reports throughput. Run from the
+backend directory:
+
+    python -m app.workers.bulk_ingest ../Data
+"""
+import argparse
+import asyncio
+import logging
+from app.core.database import db_manager
+from app.services.embedding_service import embedding_service
+from app.services.ingestion import chunker
+from app.services.bulk_ingestion import bulk_ingestion
+
+async def main(directory: str):
+    files = bulk_ingestion.discover(directory)
+    if not files:
+        print(f"No PDF/DOCX/TXT files found in {directory}")
+        return
+
+    await db_manager.init_postgres()
+    embedding_service.start()
+    try:
+        print(f"Ingesting {len(files)} files from {directory}...")
+        report = await bulk_ingestion.ingest(files)
+    finally:
+        await embedding_service.stop()
+        chunker.shutdown()
+        await db_manager.close()
+
+    for doc in report["documents"]:
+        if "error" in doc:
+            print(f"   ✗ {doc['filename']}: {doc['error']}")
+        else:
+            print(f"   ✓ {doc['filename']} -> ID {doc['document_id']} ({doc['chunks']} chunks)")
+
+    print(f"\nFiles: {report['files_ingested']}/{report['files_total']} "
+          f"({report['files_failed']} failed) in {report['elapsed_seconds']:.1f}s")
+    print(f"Throughput: {report['files_per_sec']:.2f} files/sec, {report['chunks_per_sec']:.1f} chunks/sec")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of documents")
+    parser.add_argument("directory", help="Directory to ingest, e.g. ../Data")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.directory))
@@ -0,0 +1,47 @@
+"""
+Standalone ingestion worker.
+
+Consumes the Postgres-backed ingestion queue so ingestion capacity can be
+scaled separately from the query API. Uploaded files must be reachable at
+the same path (shared volume). Run from the backend directory:
+
+    python -m app.workers.ingestion_worker --concurrency 2
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import logging
+from app.core.database import db_manager
+from app.services.embedding_service import embedding_service
+from app.services.ingestion import chunker
+from app.services.ingestion_jobs import ingestion_queue
+
+async def main(concurrency: int):
+    await db_manager.init_postgres()
+    embedding_service.start()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        await asyncio.gather(*[
+            ingestion_queue.run_worker(f"{worker_prefix}:{i}", stop_event)
+            for i in range(concurrency)
+        ])
+    finally:
+        await embedding_service.stop()
+        chunker.shutdown()
+        await db_manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ingestion queue workers")
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs processed concurrently")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.concurrency))
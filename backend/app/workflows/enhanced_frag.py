@@ -7,10 +7,75 @@ from app.services.holographic_storage import holographic_storage
 from app.services.swarm_retrieval import swarm_retriever
 from app.services.temporal_causality import temporal_engine
 from app.services.gemini_speculative_rag import gemini_speculative_rag
+from app.services.embedding_service import embedding_service
+from app.services.retrieval import SimpleRetriever
+from app.services.answer_cache import answer_cache
+from app.services.reranker import reranker
+from app.core.config import settings
 from app.models.schemas import QueryResponse, Chunk
 
-async def process_enhanced_query(query: str, document_ids: List[int] = None) -> QueryResponse:
+QUANTUM_RESULTS = 15
+# Gemini was unavailable or failed and the answer is raw extracted text - worth retrying, not caching
+EXTRACTION_FALLBACK_MODEL = "enhanced-extraction"
+UNCACHED_QUERY_TYPES = ("error", "no-results", "6-tech-extraction")
+
+async def process_enhanced_query(query: str, document_ids: List[int] = None,
+                                 search_params: Dict[str, int] = None,
+                                 candidates: List[Chunk] = None) -> QueryResponse:
     """Revolutionary 6-Technology RAG Workflow"""
+    # Every stage shares one query embedding for the lifetime of this request
+    with embedding_service.query_cache.request_scope():
+        query_embedding = await embedding_service.encode_query(query)
+        
+        # Semantically equivalent question on the same corpus: skip the pipeline and Gemini
+        filter_key = answer_cache.filter_key(document_ids, search_params)
+        cached = answer_cache.lookup(query_embedding, filter_key)
+        if cached is not None:
+            return cached
+        return await _answer_and_cache(query, query_embedding, filter_key, document_ids, search_params, candidates)
+
+async def _answer_and_cache(query: str, query_embedding, filter_key, document_ids: List[int],
+                            search_params: Dict[str, int], candidates: List[Chunk] = None) -> QueryResponse:
+    corpus_version = answer_cache.corpus_version
+    response = await _run_pipeline(query, document_ids, search_params, candidates)
+    if response.query_type not in UNCACHED_QUERY_TYPES:
+        answer_cache.store(query, query_embedding, filter_key, response, corpus_version)
+    return response
+
+async def process_enhanced_queries(queries: List[str], document_ids: List[int] = None,
+                                   search_params: Dict[str, int] = None) -> List[QueryResponse]:
+    """
+    Batch workflow: retrieval for every query runs as one batched encode and
+    one SQL round trip, then the per-query pipelines run with bounded concurrency
+    """
+    # Answered from the semantic cache need no retrieval at all
+    query_embeddings = await embedding_service.encode_queries(queries)
+    filter_key = answer_cache.filter_key(document_ids, search_params)
+    responses = [answer_cache.lookup(embedding, filter_key) for embedding in query_embeddings]
+    pending = [i for i, response in enumerate(responses) if response is None]
+    if not pending:
+        return responses
+    
+    # QuantumRetrieval over-fetches 2x before its own ranking
+    candidates = await SimpleRetriever().retrieve_batch(
+        [queries[i] for i in pending], QUANTUM_RESULTS * 2, document_ids, search_params
+    )
+    
+    semaphore = asyncio.Semaphore(settings.batch_query_concurrency)
+    
+    async def run(i: int, query_candidates: List[Chunk]):
+        async with semaphore:
+            with embedding_service.query_cache.request_scope():
+                responses[i] = await _answer_and_cache(
+                    queries[i], query_embeddings[i], filter_key, document_ids, search_params, query_candidates
+                )
+    
+    await asyncio.gather(*(run(i, chunks) for i, chunks in zip(pending, candidates)))
+    return responses
+
+async def _run_pipeline(query: str, document_ids: List[int] = None,
+                        search_params: Dict[str, int] = None,
+                        candidates: List[Chunk] = None) -> QueryResponse:
     
     print(f"\n{'='*80}")
     print(f"🚀 6-TECHNOLOGY RAG PROCESSING")
@@ -20,7 +85,15 @@ async def process_enhanced_query(query: str, document_ids: List[int] = None) ->
     try:
         # TECHNOLOGY 1: Quantum-Inspired Retrieval
         print("\n⚛️  [1/6] Quantum Retrieval...")
-        quantum_chunks = await quantum_retriever.retrieve(query, max_results=15, document_ids=document_ids)
+        alternative_queries = None
+        if settings.quantum_multi_interpretation:
+            # Paraphrases are cached, so generation reuses them for chunk selection
+            alternative_queries = (await gemini_speculative_rag.expand_query(query))[1:]
+        quantum_chunks = await quantum_retriever.retrieve(
+            query, max_results=QUANTUM_RESULTS, document_ids=document_ids,
+            search_params=search_params, candidates=candidates,
+            alternative_queries=alternative_queries
+        )
         print(f"   Retrieved {len(quantum_chunks)} chunks (coherence: {quantum_retriever.get_coherence():.2f})")
         
         if not quantum_chunks:
@@ -43,14 +116,19 @@ async def process_enhanced_query(query: str, document_ids: List[int] = None) ->
         
         # TECHNOLOGY 4: Swarm Intelligence (50 agents)
         print("\n🐝 [4/6] Swarm Intelligence...")
-        swarm_chunks = await swarm_retriever.collective_retrieve(query, holographic_chunks)
-        print(f"   Swarm selected {len(swarm_chunks)} chunks (consensus: {swarm_retriever.get_consensus():.2f})")
+        swarm_chunks, swarm_consensus = await swarm_retriever.collective_retrieve(query, holographic_chunks)
+        print(f"   Swarm selected {len(swarm_chunks)} chunks (consensus: {swarm_consensus:.2f})")
         
         # TECHNOLOGY 5: Temporal Causality (predict patterns)
         print("\n⏰ [5/6] Temporal Analysis...")
         temporal_context = await temporal_engine.analyze_causality(query, swarm_chunks)
         print(f"   Temporal confidence: {temporal_context.get('confidence', 0):.2f}")
         
+        # Optional cross-encoder rerank: fewer, better chunks into the prompt
+        if settings.reranker:
+            swarm_chunks = await reranker.rerank(query, swarm_chunks)
+            print(f"   Reranked to {len(swarm_chunks)} chunks")
+        
         # TECHNOLOGY 6: Speculative RAG (parallel generation)
         print("\n✨ [6/6] Speculative Generation...")
         result = await gemini_speculative_rag.generate_answer(query, swarm_chunks)
@@ -61,7 +139,7 @@ async def process_enhanced_query(query: str, document_ids: List[int] = None) ->
             quantum_retriever.get_coherence() * 0.15 +
             neuromorphic_memory.get_memory_strength() * 0.15 +
             (holographic_storage.get_compression_ratio() / 80) * 0.10 +
-            swarm_retriever.get_consensus() * 0.20 +
+            swarm_consensus * 0.20 +
             temporal_context.get('confidence', 0) * 0.15 +
             result['confidence'] * 0.25
         )
@@ -73,7 +151,7 @@ async def process_enhanced_query(query: str, document_ids: List[int] = None) ->
         return QueryResponse(
             answer=result["answer"],
             sources=result["sources"],
-            query_type="6-tech-enhanced",
+            query_type="6-tech-extraction" if result.get("model") == EXTRACTION_FALLBACK_MODEL else "6-tech-enhanced",
             confidence=combined_confidence
         )
         
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Chunking benchmark: semantic chunking throughput (MB/s) on the Data/ PDFs
+
+Text is extracted once up front so only sentence splitting and chunking are
+timed. The previous string-concatenating chunker is kept here as a baseline.
+Run from the backend directory:
+
+    python benchmark_chunking.py --data ../Data --repeat 5
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.document_parsing import count_pdf_pages, extract_pdf_pages
+from app.services.ingestion import chunker
+
+def legacy_chunks(pages, min_size: int, max_size: int):
+    """The pre-offset chunker: rebuilds candidate strings for every sentence and word"""
+    text = re.sub(r'\s+', ' ', " ".join(pages)).strip()
+    chunks, current_chunk = [], ""
+    for sentence in re.split(r'(?<=[.!?])\s+', text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        potential_chunk = current_chunk + " " + sentence if current_chunk else sentence
+        if len(potential_chunk) > max_size:
+            if len(current_chunk) >= min_size:
+                chunks.append(current_chunk.strip())
+                current_chunk = sentence
+            elif len(sentence) > max_size:
+                word_chunk = ""
+                for word in sentence.split():
+                    if len(word_chunk + " " + word) > max_size:
+                        if len(word_chunk) >= min_size:
+                            chunks.append(word_chunk.strip())
+                        word_chunk = word
+                    else:
+                        word_chunk += " " + word if word_chunk else word
+                current_chunk = word_chunk
+            else:
+                current_chunk = potential_chunk
+        else:
+            current_chunk = potential_chunk
+    if current_chunk.strip() and len(current_chunk) >= min_size:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+def current_chunks(pages):
+    return list(chunker.iter_chunks(chunker.iter_sentences(pages)))
+
+def bench(fn, repeat: int) -> float:
+    """Best-of-N wall time in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic chunking throughput")
+    parser.add_argument("--data", default=str(Path(__file__).resolve().parent.parent / "Data"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = sorted(Path(args.data).glob("*.pdf"))
+    if not files:
+        print(f"No PDFs found in {args.data}")
+        return
+
+    print(f"{'file':<50} {'MB':>7} {'chunks':>7} {'legacy MB/s':>12} {'current MB/s':>13} {'speedup':>8}")
+    total_bytes = total_legacy = total_current = 0.0
+    for path in files:
+        pages, _ = extract_pdf_pages(str(path), 0, count_pdf_pages(str(path)))
+        size = len("\n".join(pages).encode("utf-8")) / 1e6
+        chunks = current_chunks(pages)
+        legacy = bench(lambda: legacy_chunks(pages, chunker.min_chunk_size, chunker.max_chunk_size), args.repeat)
+        current = bench(lambda: current_chunks(pages), args.repeat)
+        total_bytes += size
+        total_legacy += legacy
+        total_current += current
+        print(f"{path.name[:50]:<50} {size:>7.2f} {len(chunks):>7} {size / legacy:>12.2f} "
+              f"{size / current:>13.2f} {legacy / current:>7.2f}x")
+
+    print(f"{'total':<50} {total_bytes:>7.2f} {'':>7} {total_bytes / total_legacy:>12.2f} "
+          f"{total_bytes / total_current:>13.2f} {total_legacy / total_current:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Vector index benchmark: latency vs. recall@k for HNSW / IVFFlat settings
+
+Uses stored chunk embeddings as queries and an exact (sequential scan)
+search as ground truth. Run from the backend directory against a
+populated database:
+
+    python benchmark_vector_index.py --index hnsw --queries 100 --k 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db_manager
+
+HNSW_EF_SEARCH = [10, 20, 40, 80, 160, 320]
+IVFFLAT_PROBES = [1, 2, 5, 10, 20, 50]
+
+async def search(conn, query_embedding, k: int, ef_search: int = None, probes: int = None,
+                 exact: bool = False):
+    """Run one top-k search and return (chunk ids, latency in ms)"""
+    sql = f"""
+        SELECT id FROM chunks
+        ORDER BY {db_manager.vector_distance_sql('embedding', '$1')}
+        LIMIT $2
+    """
+    start = time.perf_counter()
+    async with conn.transaction():
+        if exact:
+            await conn.execute("SET LOCAL enable_indexscan = off")
+        else:
+            await db_manager.apply_search_params(conn, ef_search, probes)
+        rows = await conn.fetch(sql, query_embedding, k)
+    return [row['id'] for row in rows], (time.perf_counter() - start) * 1000
+
+async def run_benchmark(index_type: str, n_queries: int, k: int, rebuild: bool):
+    await db_manager.init_postgres()
+
+    try:
+        if rebuild:
+            print(f"Building {index_type} index...")
+            start = time.perf_counter()
+            info = await db_manager.create_vector_index(index_type, rebuild=True)
+            print(f"   {info} in {time.perf_counter() - start:.1f}s")
+
+        async with db_manager.pg_pool.acquire() as conn:
+            chunk_count = await conn.fetchval("SELECT COUNT(*) FROM chunks")
+            rows = await conn.fetch(
+                "SELECT embedding FROM chunks ORDER BY random() LIMIT $1", n_queries
+            )
+            queries = [row['embedding'] for row in rows]
+
+            if not queries:
+                print("No chunks found - ingest documents first")
+                return
+
+            print(f"Corpus: {chunk_count} chunks, {len(queries)} queries, k={k}")
+
+            # Ground truth from exact search
+            ground_truth = []
+            exact_latencies = []
+            for query in queries:
+                ids, latency = await search(conn, query, k, exact=True)
+                ground_truth.append(set(ids))
+                exact_latencies.append(latency)
+
+            print(f"\n{'setting':<18}{'recall@' + str(k):>12}{'p50 ms':>10}{'p95 ms':>10}")
+            print(f"{'exact (seq scan)':<18}{1.0:>12.3f}"
+                  f"{np.percentile(exact_latencies, 50):>10.2f}{np.percentile(exact_latencies, 95):>10.2f}")
+
+            sweep = HNSW_EF_SEARCH if index_type == 'hnsw' else IVFFLAT_PROBES
+            for value in sweep:
+                recalls = []
+                latencies = []
+                for query, truth in zip(queries, ground_truth):
+                    if index_type == 'hnsw':
+                        ids, latency = await search(conn, query, k, ef_search=value)
+                    else:
+                        ids, latency = await search(conn, query, k, probes=value)
+                    recalls.append(len(truth.intersection(ids)) / max(len(truth), 1))
+                    latencies.append(latency)
+
+                label = f"ef_search={value}" if index_type == 'hnsw' else f"probes={value}"
+                print(f"{label:<18}{np.mean(recalls):>12.3f}"
+                      f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}")
+    finally:
+        await db_manager.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ANN index recall vs. latency")
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index before benchmarking")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.index, args.queries, args.k, args.rebuild))
@@ -1,6 +1,8 @@
 import axios from 'axios';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8080';
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 30 * 60 * 1000; // give up on ingestion jobs after 30 minutes
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -29,6 +31,25 @@ export const queryAPI = {
         'Content-Type': 'multipart/form-data',
       },
     });
+
+    // Ingestion runs in the background - poll the job until it finishes or we give up
+    const { job_id: jobId } = response.data;
+    const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const job = await queryAPI.getJob(jobId);
+      if (job.status === 'completed') {
+        return { ...response.data, ...job, message: 'Document processed successfully' };
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Document processing failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+    throw new Error(`Document processing is taking too long (job ${jobId}); check the job status later`);
+  },
+
+  getJob: async (jobId) => {
+    const response = await api.get(`/jobs/${jobId}`);
     return response.data;
   },
 